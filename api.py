@@ -0,0 +1,178 @@
+# JSON HTTP API alongside the Streamlit UI.
+#
+# Exposes the same pipeline the app uses (process_pdf/clean_text, OCR and MCQ
+# generation through the question bank) as asynchronous jobs:
+#
+#   POST /v1/extract        multipart PDF   -> {"job_id": ...}
+#                           (optional form fields: backend, pages="120-180, 200", chapters="8,9,10")
+#   POST /v1/ocr            multipart image -> {"job_id": ...}
+#   POST /v1/mcqs           JSON body       -> {"job_id": ...}
+#   GET  /v1/jobs/{id}                      -> status and, once done, the result
+#   GET  /v1/jobs/{id}/events               -> server-sent events until the job finishes
+#   GET  /v1/usage?group_by=document        -> LLM tokens and cost from the usage ledger
+#                           (group_by: document, user, provider, model, day, prompt_chars; optional since)
+#
+# Run with:  uvicorn api:app --host 0.0.0.0 --port 8000
+# and start workers with:  python worker.py --processes 4
+#
+# Jobs go through the durable queue (job_queue.py) and are run by worker.py
+# processes, so the event loop only spools uploads and reports status, and a job
+# keeps running (and can be polled from any API process) if the client or the
+# API server goes away. Queue and ledger calls are blocking SQLite queries, so
+# handlers run them with asyncio.to_thread rather than on the event loop.
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from PyPDF2.errors import PdfReadError
+
+import job_queue
+import ledger
+import metrics
+import segment
+import spool
+from pipeline import PDF_BACKENDS, count_pages, parse_page_ranges
+
+EVENT_INTERVAL = 0.5
+
+app = FastAPI(title="AI Exam Agent API")
+
+# Expose Prometheus metrics on the side port (once per process)
+metrics.start_server()
+
+
+class MCQRequest(BaseModel):
+    text: str
+    doc_hash: str = None
+    chapter: str = None
+    page: int = None
+    # Who the LLM spend is booked to in the usage ledger
+    user: str = None
+    # Keep only the key sentences, about 1/reduction of the text's tokens (1 sends the text as is)
+    reduction: float = 1.0
+    priority: int = job_queue.PRIORITY_NORMAL
+
+
+# Function to add a job to the durable queue (the queue-depth gauge is read from the queue at scrape time)
+def _submit(kind, payload, priority=job_queue.PRIORITY_NORMAL):
+    return job_queue.default_queue().enqueue(kind, payload, priority)
+
+
+# Function to describe a job as JSON
+def _job_view(job):
+    view = {key: job[key] for key in ("id", "kind", "status", "progress", "message", "attempts", "created_at", "finished_at")}
+    if job["status"] == "done":
+        view["result"] = job["result"]
+    elif job["error"]:
+        view["error"] = job["error"]
+    return view
+
+
+def _get_job(job_id):
+    job = job_queue.default_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job")
+    return job
+
+
+# Function to turn a page range ("120-180, 200") and/or outline chapter numbers ("8,9,10") into page indexes.
+# The upload is always parsed, so a file that is not a readable PDF is rejected here rather than in a worker.
+def _select_pages(path, pages, chapters):
+    with spool.mapped(path) as view:
+        page_count = count_pages(view)
+        outline = segment.read_outline(view) if chapters else []
+    if not pages and not chapters:
+        return None
+    selected = set(parse_page_ranges(pages, page_count)) if pages else set()
+    if chapters:
+        ranges = segment.outline_chapters(outline, page_count)
+        numbers = [int(number) for number in chapters.split(",") if number.strip()]
+        if any(not 1 <= number <= len(ranges) for number in numbers):
+            raise ValueError(f"the outline has {len(ranges)} chapters")
+        selected.update(segment.chapter_pages(ranges[number - 1] for number in numbers))
+    return sorted(selected)
+
+
+# Function to copy an upload into the job spool in chunks, off the event loop
+async def _spool(file):
+    return await asyncio.to_thread(job_queue.default_queue().spool, file.file, os.path.splitext(file.filename or "")[1])
+
+
+@app.post("/v1/extract", status_code=202)
+async def extract(
+    file: UploadFile = File(...), backend: str = Form(None), pages: str = Form(None), chapters: str = Form(None),
+):
+    if backend is not None and backend not in PDF_BACKENDS:
+        raise HTTPException(status_code=422, detail=f"backend must be one of {', '.join(PDF_BACKENDS)}")
+    path = await _spool(file)
+    try:
+        page_numbers = await asyncio.to_thread(_select_pages, path, pages, chapters)
+        job_id = await asyncio.to_thread(_submit, "extract", {"path": path, "backend": backend, "pages": page_numbers})
+        return {"job_id": job_id}
+    except (ValueError, PdfReadError) as error:
+        # A bad page selection or an unreadable PDF: no job will ever read the spooled copy
+        os.remove(path)
+        raise HTTPException(status_code=422, detail=str(error))
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+@app.post("/v1/ocr", status_code=202)
+async def ocr(file: UploadFile = File(...)):
+    path = await _spool(file)
+    return {"job_id": await asyncio.to_thread(_submit, "ocr", {"path": path}, job_queue.PRIORITY_INTERACTIVE)}
+
+
+@app.post("/v1/mcqs", status_code=202)
+async def mcqs(request: MCQRequest):
+    payload = {
+        "text": request.text, "doc_hash": request.doc_hash, "chapter": request.chapter, "page": request.page,
+        "reduction": request.reduction, "user": request.user,
+    }
+    return {"job_id": await asyncio.to_thread(_submit, "mcqs", payload, request.priority)}
+
+
+@app.get("/v1/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _job_view(await asyncio.to_thread(_get_job, job_id))
+
+
+@app.get("/v1/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    await asyncio.to_thread(_get_job, job_id)
+
+    async def stream():
+        last = None
+        while True:
+            view = _job_view(await asyncio.to_thread(_get_job, job_id))
+            # An event whenever the status or the progress changes, with the result on the last one
+            if (view["status"], view["progress"], view["message"]) != last:
+                last = (view["status"], view["progress"], view["message"])
+                yield f"event: {view['status']}\ndata: {json.dumps(view)}\n\n"
+            if view["status"] in ("done", "failed"):
+                return
+            await asyncio.sleep(EVENT_INTERVAL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+# Function to read totals and grouped rows from the usage ledger
+def _usage(group_by, since, limit):
+    book = ledger.default_ledger()
+    return {"totals": book.totals(since), "rows": book.summary(group_by, since, limit)}
+
+
+@app.get("/v1/usage")
+async def usage(group_by: str = "document", since: float = None, limit: int = 50):
+    if group_by not in ledger.GROUPS:
+        raise HTTPException(status_code=422, detail=f"group_by must be one of {', '.join(ledger.GROUPS)}")
+    return await asyncio.to_thread(_usage, group_by, since, limit)
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
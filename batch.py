@@ -0,0 +1,227 @@
+# Offline batch generation through provider batch files (JSONL).
+#
+# Overnight library runs should not make thousands of interactive completion
+# calls. Instead, every chunk that still needs questions becomes one line of a
+# request file in the provider batch format:
+#
+#   {"custom_id": "<source hash>", "method": "POST", "url": "/v1/completions", "body": {...}}
+#
+# where body is exactly what openai_complete would send (pipeline.completion_body).
+# The file is uploaded to the batch endpoint out of band, and the results file
+# it returns, with one {"custom_id", "response": {"status_code", "body"}, "error"}
+# line per request, is ingested later: questions go into the bank under the
+# chunk's document, chapter and page, and usage goes into the ledger at the batch
+# price. What ingestion needs to know about each request (document, page, user)
+# is kept in a manifest next to the request file, keyed by custom_id. Each result
+# is booked under its id, so re-ingesting a file adds no questions and no spend.
+#
+# run_local() stands in for the provider: it answers a request file with any
+# completion function and writes a results file in the same format, so the
+# write -> process -> ingest round trip can be exercised offline. Its result lines
+# name the completion function's provider, and the stand-in's is unbilled.
+#
+#   python batch.py write books/*.pdf --out data/batches/nightly.jsonl
+#   python batch.py run-local data/batches/nightly.jsonl data/batches/nightly.results.jsonl
+#   python batch.py ingest data/batches/nightly.results.jsonl --manifest data/batches/nightly.manifest.jsonl
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+
+import ledger
+import question_bank
+import tables
+from pipeline import (
+    MCQ_MODEL, MCQ_PROMPT, MCQ_PROVIDER, PDF_BACKENDS, chunk_text, clean_text, completion_body, completion_text, document_hash,
+    extract_pages, join_pages, openai_complete, page_at, parse_mcqs, strip_headers,
+)
+
+BATCH_DIR = os.path.join("data", "batches")
+BATCH_URL = "/v1/completions"
+BATCH_PROVIDER = "openai-batch"
+# Batch endpoints bill at a discount on the interactive price
+BATCH_PRICE_FACTOR = float(os.getenv("BATCH_PRICE_FACTOR", "0.5"))
+# Provider limit on requests per batch file; longer runs are split into numbered parts
+MAX_REQUESTS_PER_FILE = 50000
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+
+
+# Function to name the manifest that goes with a request file (nightly.jsonl -> nightly.manifest.jsonl)
+def manifest_path(requests_path):
+    return os.path.splitext(requests_path)[0] + ".manifest.jsonl"
+
+
+def _part_path(path, part):
+    if part == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{part}{ext}"
+
+
+# Function to write batch request lines (and their manifest) for text slices that are not in the bank yet.
+# Each item is a dict with "text" and "doc_hash", optionally "chapter", "page" and "user". Returns the request files.
+def write_requests(items, path, bank=None, prompt=MCQ_PROMPT):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    paths = []
+    seen = set()
+    requests_file = manifest_file = None
+    count = 0
+    try:
+        for item in items:
+            source_hash = document_hash(item["text"])
+            if source_hash in seen or (bank is not None and bank.for_source(source_hash)):
+                continue
+            seen.add(source_hash)
+            if count % MAX_REQUESTS_PER_FILE == 0:
+                if requests_file:
+                    requests_file.close()
+                    manifest_file.close()
+                paths.append(_part_path(path, count // MAX_REQUESTS_PER_FILE + 1))
+                requests_file = open(paths[-1], "w", encoding="utf-8")
+                manifest_file = open(manifest_path(paths[-1]), "w", encoding="utf-8")
+            request = prompt.format(text=item["text"])
+            requests_file.write(json.dumps({
+                "custom_id": source_hash, "method": "POST", "url": BATCH_URL, "body": completion_body(request),
+            }) + "\n")
+            manifest_file.write(json.dumps({
+                "custom_id": source_hash, "doc_hash": item["doc_hash"], "chapter": item.get("chapter"),
+                "page": item.get("page"), "user": item.get("user"), "prompt_chars": len(request),
+            }) + "\n")
+            count += 1
+    finally:
+        if requests_file:
+            requests_file.close()
+            manifest_file.close()
+    return paths
+
+
+# Function to turn a PDF into batch items: one per chunk of its cleaned text, with the chunk's page
+def pdf_items(path, backend=None, user=None):
+    text, page_starts = join_pages([clean_text(page) for page in strip_headers(extract_pages(path, backend=backend))])
+    doc_hash = tables.file_digest(path)
+    offset = 0
+    for chunk in chunk_text(text):
+        if chunk.strip():
+            yield {"text": chunk, "doc_hash": doc_hash, "page": page_at(page_starts, offset) + 1, "user": user}
+        offset += len(chunk)
+
+
+# Function to answer a request file locally, writing a results file in the provider's output format
+def run_local(requests_path, results_path, complete=None):
+    complete = complete or stand_in_complete
+    provider = getattr(complete, "provider", MCQ_PROVIDER)
+    # Result ids are unique per run, like the provider's, since the ledger books each one once
+    run = uuid.uuid4().hex[:12]
+    processed = 0
+    with open(requests_path, encoding="utf-8") as requests_file, open(results_path, "w", encoding="utf-8") as results:
+        for line in requests_file:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {
+                "id": f"batch_req_{run}_{processed}", "custom_id": request["custom_id"], "provider": provider,
+                "response": None, "error": None,
+            }
+            try:
+                body = complete(request["body"]["prompt"], max_tokens=request["body"]["max_tokens"])
+                result["response"] = {"status_code": 200, "request_id": result["id"], "body": body}
+            except Exception as error:
+                result["error"] = {"code": type(error).__name__, "message": str(error)}
+            results.write(json.dumps(result) + "\n")
+            processed += 1
+    return processed
+
+
+# Function standing in for the LLM offline: one deterministic question built from the prompt's own words
+def stand_in_complete(prompt, max_tokens=None):
+    words = list(dict.fromkeys(word.lower() for word in _WORD.findall(prompt.rsplit("\n\n", 1)[-1])))
+    options = sorted(words, key=lambda word: (-len(word), word))[:4] or ["none"]
+    text = "1. Which of these terms appears in the source text?\n"
+    text += "\n".join(f"{letter}) {option}" for letter, option in zip("abcd", options))
+    text += "\nAnswer: a\nDifficulty: easy"
+    return {
+        "model": MCQ_MODEL, "choices": [{"text": text}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+    }
+
+
+# Booked at no cost in the usage ledger
+stand_in_complete.provider = "batch-stand-in"
+
+
+# Function to ingest a results file: store the questions in the bank and the usage in the ledger.
+# Re-ingesting a file is safe: slices that already have questions are skipped, and results already booked
+# (failed ones included) add no ledger rows.
+def ingest_results(results_path, manifest=None, bank=None, book=None):
+    manifest = manifest or manifest_path(results_path.replace(".results", ""))
+    with open(manifest, encoding="utf-8") as f:
+        entries = {entry["custom_id"]: entry for entry in map(json.loads, filter(str.strip, f))}
+    bank = bank or question_bank.default_bank()
+    book = book or ledger.default_ledger()
+    counts = {"requests": 0, "questions": 0, "failed": 0, "skipped": 0}
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            entry = entries.get(result["custom_id"])
+            counts["requests"] += 1
+            if entry is None or bank.for_source(result["custom_id"]):
+                counts["skipped"] += 1
+                continue
+            response = result.get("response") or {}
+            failed = bool(result.get("error")) or response.get("status_code") != 200
+            body = response.get("body") or {}
+            usage = body.get("usage") or {}
+            # Provider results name no provider; run_local's name the function that answered them
+            provider = result.get("provider", BATCH_PROVIDER)
+            booked = book.record(
+                provider, body.get("model", MCQ_MODEL), usage.get("prompt_tokens", 0),
+                usage.get("completion_tokens", 0), 0.0, user=entry["user"], doc_hash=entry["doc_hash"],
+                prompt_chars=entry["prompt_chars"], failed=failed,
+                price_factor=BATCH_PRICE_FACTOR if provider == BATCH_PROVIDER else 1.0,
+                call_id=f"batch:{result['id']}" if result.get("id") else None,
+            )
+            if failed:
+                counts["failed" if booked is not None else "skipped"] += 1
+                continue
+            ids = bank.add_questions(
+                parse_mcqs(completion_text(body)), entry["doc_hash"], result["custom_id"], entry["chapter"], entry["page"],
+            )
+            counts["questions"] += len(ids)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch MCQ generation")
+    commands = parser.add_subparsers(dest="command", required=True)
+    write = commands.add_parser("write", help="write a batch request file for PDFs")
+    write.add_argument("pdfs", nargs="+")
+    write.add_argument("--out", default=os.path.join(BATCH_DIR, time.strftime("%Y%m%d-%H%M%S") + ".jsonl"))
+    write.add_argument("--backend", choices=PDF_BACKENDS)
+    write.add_argument("--user")
+    local = commands.add_parser("run-local", help="answer a request file locally (offline stand-in or OpenAI)")
+    local.add_argument("requests")
+    local.add_argument("results")
+    local.add_argument("--openai", action="store_true", help="call the interactive endpoint instead of the stand-in")
+    ingest = commands.add_parser("ingest", help="ingest a batch results file")
+    ingest.add_argument("results")
+    ingest.add_argument("--manifest")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        bank = question_bank.default_bank()
+        items = (item for pdf in args.pdfs for item in pdf_items(pdf, args.backend, args.user))
+        for path in write_requests(items, args.out, bank):
+            print(path)
+    elif args.command == "run-local":
+        print(run_local(args.requests, args.results, openai_complete if args.openai else None), "requests processed")
+    else:
+        print(json.dumps(ingest_results(args.results, args.manifest)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# Benchmark suite for the exam agent pipeline, driven by the temp_input.txt corpus.
+#
+# Run from the repository root:
+#   python -m benchmarks.run_benchmarks --scales 1 10 100
+#   python -m benchmarks.run_benchmarks --compare benchmarks/results/baseline.json
+#
+# Synthetic PDFs are rendered from the corpus with PyMuPDF and cached in
+# benchmarks/.cache so repeated runs only pay for rendering once.
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+# LLM calls made here (mock or replayed) are booked to a scratch usage ledger, never the app's data/ledger.db.
+# Set before pipeline is imported, and inherited by the worker processes the benchmarks start.
+os.environ["LEDGER_PATH"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ledger.db")
+
+import fitz
+
+from pipeline import process_pdf, extract_pages, strip_headers, clean_text, chunk_text, generate_mcqs, extract_text_from_image
+import spool
+import drug_index
+import key_sentences
+import replay
+import tables
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_PATH = os.path.join(ROOT, "temp_input.txt")
+CACHE_DIR = os.path.join(ROOT, "benchmarks", ".cache")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+LINES_PER_PAGE = 60
+FONT_SIZE = 9
+# Book pages for the running-head benchmark: body lines per page and first printed page number
+BOOK_LINES_PER_PAGE = 45
+BOOK_FIRST_PAGE = 101
+# Scan-like PDF for the upload memory benchmark: pages of incompressible greyscale image
+SCANNED_PAGES = 20
+SCAN_SIDE = 700
+
+# Metrics where a bigger number is better, and non-latency metrics where a smaller one is; other names
+# ending in "seconds" are latencies and anything else is informational
+HIGHER_IS_BETTER = ("pages_per_s", "mb_per_s", "chunks_per_s", "cached_pages_per_s", "drug_coverage")
+LOWER_IS_BETTER = ("per_upload_mb", "peak_mb")
+# Result sections checked against a baseline
+COMPARED_SECTIONS = ("scales", "corpus", "grading", "uploads")
+
+
+# Function to load the pharmacology corpus shipped with the repo
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+# Function to render the corpus (repeated `scale` times) into a PDF, cached on disk
+def render_pdf(corpus, scale):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"corpus_x{scale}.pdf")
+    if os.path.exists(path):
+        return path
+    lines = corpus.splitlines()
+    doc = fitz.open()
+    for _ in range(scale):
+        for start in range(0, len(lines), LINES_PER_PAGE):
+            page = doc.new_page()
+            page.insert_text((36, 40), "\n".join(lines[start:start + LINES_PER_PAGE]), fontsize=FONT_SIZE)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+# Function to render a scan-like PDF (one incompressible page image per page), cached on disk
+def render_scanned_pdf(pages=SCANNED_PAGES):
+    from PIL import Image
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"scanned_{pages}.pdf")
+    if os.path.exists(path):
+        return path
+    doc = fitz.open()
+    for number in range(pages):
+        buffer = io.BytesIO()
+        Image.frombytes("L", (SCAN_SIDE, SCAN_SIDE), os.urandom(SCAN_SIDE * SCAN_SIDE)).save(buffer, "PNG")
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buffer.getvalue())
+        page.insert_text((36, 40), f"Scanned page {number + 1}", fontsize=FONT_SIZE)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+# Function to time a callable a few times and keep the best and median wall times
+def time_call(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings), result
+
+
+# Function to build a completion function that stands in for the OpenAI API
+def mock_complete(latency):
+    def complete(prompt, max_tokens=1000):
+        time.sleep(latency)
+        text = "1. Which drug is the prototype muscarinic antagonist?\na) Atropine\nb) Neostigmine\nc) Pilocarpine\nd) Physostigmine\nAnswer: a"
+        return {
+            "choices": [{"text": text}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+        }
+    # Priced at 0 in the usage ledger
+    complete.provider = "mock"
+    return complete
+
+
+# Function to measure PDF extraction throughput in pages per second
+def bench_extraction(pdf_path, repeat, backend=None, page_numbers=None):
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count if page_numbers is None else len(page_numbers)
+
+    def run():
+        with open(pdf_path, "rb") as f:
+            return process_pdf(f, backend=backend, page_numbers=page_numbers)
+
+    best, median, text = time_call(run, repeat)
+    return {"pages": pages, "seconds": best, "median_seconds": median, "pages_per_s": pages / best}, text
+
+
+# Function to measure cleaning throughput in MB per second
+def bench_cleaning(text, repeat):
+    best, median, cleaned = time_call(lambda: clean_text(text), repeat)
+    mb = len(text.encode("utf-8")) / 1e6
+    return {"mb": mb, "seconds": best, "median_seconds": median, "mb_per_s": mb / best,
+            "chars_removed": 1 - len(cleaned) / max(len(text), 1)}, cleaned
+
+
+# Function to lay the corpus out as book pages, each with its chapter's running head and a page number
+def book_pages(corpus):
+    lines = corpus.splitlines()
+    pages = []
+    planted = 0
+    head = "CHAPTER 1GENERAL PHARMACOLOGY"
+    for number, start in enumerate(range(0, len(lines), BOOK_LINES_PER_PAGE), BOOK_FIRST_PAGE):
+        body = lines[start:start + BOOK_LINES_PER_PAGE]
+        head = next((line for line in reversed(body) if re.match(r"CHAPTER \d+[A-Z]", line)), head)
+        if number % 2:
+            # Odd pages: number on its own line above the head; even pages: number glued to the last line
+            pages.append("\n".join([str(number), head] + body))
+            planted += 2
+        else:
+            pages.append("\n".join([head] + body[:-1] + [body[-1] + str(number)]))
+            planted += 1
+    return pages, planted
+
+
+# Function to measure running-head stripping throughput, and how many planted header lines it removes
+def bench_running_heads(corpus, repeat):
+    pages, planted = book_pages(corpus)
+    best, median, stripped = time_call(lambda: strip_headers(pages), repeat)
+    removed = sum(page.count("\n") for page in pages) - sum(page.count("\n") for page in stripped)
+    return {"pages": len(pages), "seconds": best, "median_seconds": median, "pages_per_s": len(pages) / best,
+            "lines_planted": planted, "lines_removed": removed}
+
+
+# Function to measure table detection: a cold pass that fills the per-page cache, then passes served from it
+def bench_tables(pdf_path, repeat):
+    cache_dir = os.path.join(CACHE_DIR, "tables")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    start = time.perf_counter()
+    found = tables.tables_for_pages(pdf_path, root=cache_dir)
+    cold = time.perf_counter() - start
+    best, median, _ = time_call(lambda: tables.tables_for_pages(pdf_path, root=cache_dir), repeat)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    with fitz.open(pdf_path) as doc:
+        pages = doc.page_count
+    return {"pages": pages, "tables": len(found), "seconds": cold, "pages_per_s": pages / cold,
+            "cached_seconds": best, "cached_median_seconds": median, "cached_pages_per_s": pages / best}
+
+
+# Function to measure key-sentence selection: prompt tokens kept and the share of drugs still mentioned
+def bench_key_sentences(text, repeat, factor=key_sentences.REDUCTION_FACTOR):
+    best, median, selected = time_call(lambda: key_sentences.select_key_sentences(text, factor=factor), repeat)
+    drugs = set(drug_index.build_entity_index(text))
+    kept = set(drug_index.build_entity_index(selected))
+    return {"seconds": best, "median_seconds": median, "tokens": key_sentences.estimate_tokens(text),
+            "selected_tokens": key_sentences.estimate_tokens(selected), "drug_coverage": len(kept) / max(len(drugs), 1)}
+
+
+# Function to measure chunking throughput
+def bench_chunking(text, repeat):
+    best, median, chunks = time_call(lambda: chunk_text(text), repeat)
+    mb = len(text.encode("utf-8")) / 1e6
+    return {"chunks": len(chunks), "seconds": best, "median_seconds": median,
+            "mb_per_s": mb / best, "chunks_per_s": len(chunks) / best}, chunks
+
+
+# Function to measure OCR latency on rendered page images
+def bench_ocr(pdf_path, pages):
+    if shutil.which("tesseract") is None:
+        return {"skipped": "tesseract binary not found"}
+    from PIL import Image
+    latencies = []
+    with fitz.open(pdf_path) as doc:
+        for number in range(min(pages, doc.page_count)):
+            pix = doc[number].get_pixmap(dpi=150)
+            image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            start = time.perf_counter()
+            extract_text_from_image(image)
+            latencies.append(time.perf_counter() - start)
+    return {"pages": len(latencies), "mean_seconds": statistics.mean(latencies),
+            "max_seconds": max(latencies), "pages_per_s": len(latencies) / sum(latencies)}
+
+
+# Function run in a fresh process: `uploads` concurrent sessions extract the same upload, held in RAM or spooled
+def _upload_rss_child(mode, backend, pdf_path, uploads, results):
+    import resource
+    spool_dir = os.path.join(CACHE_DIR, "spool")
+    barrier = threading.Barrier(uploads)
+
+    def session():
+        with open(pdf_path, "rb") as source:
+            if mode == "in_memory":
+                # What st.file_uploader hands over: the whole file as a BytesIO
+                upload = io.BytesIO(source.read())
+            else:
+                upload = spool.spool_upload(source, ".pdf", spool_dir)
+        # Every session holds its upload at the same time
+        barrier.wait()
+        extract_pages(upload, backend=backend)
+        barrier.wait()
+        if mode != "in_memory":
+            os.remove(upload)
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    threads = [threading.Thread(target=session) for _ in range(uploads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    results.put({"baseline_mb": baseline / 1024, "peak_mb": peak / 1024, "per_upload_mb": (peak - baseline) / 1024 / uploads})
+
+
+# Function to measure peak RSS with concurrent uploads held in memory versus spooled to disk and mmapped
+def bench_upload_rss(uploads):
+    pdf_path = render_scanned_pdf()
+    context = multiprocessing.get_context("spawn")
+    result = {"uploads": uploads, "file_mb": os.path.getsize(pdf_path) / 1e6}
+    for backend in ("pypdf2", "pymupdf"):
+        for mode in ("in_memory", "spooled"):
+            queue = context.Queue()
+            process = context.Process(target=_upload_rss_child, args=(mode, backend, pdf_path, uploads, queue))
+            process.start()
+            result[f"{backend}_{mode}"] = queue.get()
+            process.join()
+    return result
+
+
+# Function to time extraction through MCQ generation against the mock LLM, or replayed traffic from a journal
+def bench_end_to_end(pdf_path, llm_latency, max_chunks, journal=None, latency_scale=1.0):
+    complete = mock_complete(llm_latency) if journal is None else replay.replay_complete(journal, latency_scale, strict=False)
+    start = time.perf_counter()
+    with open(pdf_path, "rb") as f:
+        text = process_pdf(f)
+    extracted = time.perf_counter()
+    chunks = chunk_text(clean_text(text))[:max_chunks]
+    for chunk in chunks:
+        generate_mcqs(chunk, complete=complete)
+    done = time.perf_counter()
+    return {"chunks": len(chunks), "llm_latency": llm_latency if journal is None else f"replay x{latency_scale}",
+            "extract_seconds": extracted - start, "seconds": done - start}
+
+
+# Function to time grading and item analysis on a synthetic students x questions response matrix
+def bench_item_analysis(students, questions, repeat):
+    import numpy as np
+    import grading
+    rng = np.random.default_rng(0)
+    key = rng.integers(0, 4, questions).astype(np.int8)
+    responses = rng.integers(-1, 4, (students, questions)).astype(np.int8)
+    best, median, _ = time_call(lambda: grading.item_analysis(responses, key, 4), repeat)
+    return {"students": students, "questions": questions, "seconds": best, "median_seconds": median}
+
+
+# Function to run every benchmark at every scale and collect the results
+def run(scales, repeat, ocr_pages, llm_latency, max_chunks, uploads, journal=None, latency_scale=1.0):
+    corpus = load_corpus()
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_bytes": len(corpus.encode("utf-8")),
+        "scales": {},
+    }
+    # Normalization straight on the corpus text, independent of PDF rendering
+    results["corpus"] = {
+        "normalization": bench_cleaning(corpus, repeat)[0],
+        "running_heads": bench_running_heads(corpus, repeat),
+        "key_sentences": bench_key_sentences(clean_text(corpus), repeat),
+    }
+    results["grading"] = {"item_analysis": bench_item_analysis(1000, 200, repeat)}
+    print(f"upload memory: {uploads} concurrent uploads", file=sys.stderr)
+    results["uploads"] = {"rss": bench_upload_rss(uploads)}
+    for scale in scales:
+        print(f"scale x{scale}: rendering", file=sys.stderr)
+        pdf_path = render_pdf(corpus, scale)
+        stage = {}
+        print(f"scale x{scale}: extraction", file=sys.stderr)
+        # PyPDF2 stays the reference backend here, so results compare with earlier baselines
+        stage["extraction"], text = bench_extraction(pdf_path, repeat, backend="pypdf2")
+        stage["extraction_pymupdf"], _ = bench_extraction(pdf_path, repeat, backend="pymupdf")
+        # A few chapters' worth: one contiguous tenth of the pages
+        total = stage["extraction"]["pages"]
+        selected = list(range(total // 2, total // 2 + max(total // 10, 1)))
+        stage["extraction_tenth"], _ = bench_extraction(pdf_path, repeat, backend="pypdf2", page_numbers=selected)
+        stage["tables"] = bench_tables(pdf_path, repeat)
+        stage["cleaning"], cleaned = bench_cleaning(text, repeat)
+        stage["chunking"], _ = bench_chunking(cleaned, repeat)
+        if scale == scales[0]:
+            print(f"scale x{scale}: ocr and end-to-end", file=sys.stderr)
+            stage["ocr"] = bench_ocr(pdf_path, ocr_pages)
+            stage["end_to_end"] = bench_end_to_end(pdf_path, llm_latency, max_chunks, journal, latency_scale)
+        results["scales"][f"x{scale}"] = stage
+    return results
+
+
+# Function to pair every numeric metric of a baseline section with the current run's value, by dotted path
+def _metric_pairs(old, new, path):
+    for name, value in old.items():
+        current = new.get(name) if isinstance(new, dict) else None
+        if isinstance(value, dict):
+            yield from _metric_pairs(value, current, f"{path}.{name}")
+        elif isinstance(value, (int, float)) and isinstance(current, (int, float)):
+            yield f"{path}.{name}", name, value, current
+
+
+# Function to flag metrics that regressed by more than `tolerance` against a baseline file
+def compare(results, baseline, tolerance):
+    regressions = []
+    for section in COMPARED_SECTIONS:
+        for path, name, old, new in _metric_pairs(baseline.get(section, {}), results.get(section, {}), section):
+            if old == 0:
+                continue
+            if name in HIGHER_IS_BETTER:
+                change = (old - new) / old
+            elif name in LOWER_IS_BETTER or name.endswith("seconds"):
+                change = (new - old) / old
+            else:
+                continue
+            if change > tolerance:
+                regressions.append(f"{path}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the exam agent pipeline on the temp_input.txt corpus")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ocr-pages", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds slept by the mock LLM per call")
+    parser.add_argument("--max-chunks", type=int, default=10)
+    parser.add_argument("--replay", help="journal of recorded LLM traffic to replay instead of the mock (see replay.py)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply replayed latencies")
+    parser.add_argument("--uploads", type=int, default=20, help="concurrent uploads for the memory benchmark")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    journal = replay.Journal(args.replay) if args.replay else None
+    results = run(args.scales, args.repeat, args.ocr_pages, args.llm_latency, args.max_chunks, args.uploads,
+                  journal, args.latency_scale)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
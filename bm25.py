@@ -0,0 +1,135 @@
+# BM25 inverted index over text passages.
+#
+# Postings are stored CSR-style in flat arrays rather than per-term Python lists:
+# term t owns doc_ids[offsets[t]:offsets[t + 1]] and the matching term frequencies
+# in tfs. That keeps a whole-book index to a few compact buffers that can be
+# written to and read from disk without any per-posting object overhead.
+#
+#   index = BM25Index.build(passages)
+#   index.save("data/bm25/<doc hash>")
+#   BM25Index.load("data/bm25/<doc hash>").search("atropine toxicity", k=5)
+import heapq
+import json
+import math
+import os
+import re
+from array import array
+
+import metrics
+from pipeline import chunk_text, document_hash
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were which with".split()
+)
+PASSAGE_CHARS = 1500
+INDEX_DIR = os.getenv("BM25_INDEX_DIR", os.path.join("data", "bm25"))
+
+
+# Function to split text into lowercase index terms
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+# Class holding the BM25 postings and the passages they point into
+class BM25Index:
+    def __init__(self, terms, offsets, doc_ids, tfs, doc_lens, passages, k1=1.5, b=0.75):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.avg_len = sum(doc_lens) / len(doc_lens) if doc_lens else 0.0
+
+    # Build an index from a list of passages
+    @classmethod
+    def build(cls, passages, k1=1.5, b=0.75):
+        postings = {}
+        doc_lens = array("I")
+        for doc_id, passage in enumerate(passages):
+            tokens = tokenize(passage)
+            doc_lens.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc_id, count))
+
+        terms = sorted(postings)
+        offsets = array("I", [0])
+        doc_ids = array("I")
+        tfs = array("I")
+        for term in terms:
+            for doc_id, count in postings[term]:
+                doc_ids.append(doc_id)
+                tfs.append(count)
+            offsets.append(len(doc_ids))
+        return cls(terms, offsets, doc_ids, tfs, doc_lens, list(passages), k1, b)
+
+    def __len__(self):
+        return len(self.passages)
+
+    # Return the top-k (score, doc_id) pairs for a query
+    def search(self, query, k=5):
+        n = len(self.doc_lens)
+        if not n:
+            return []
+        scores = {}
+        k1, b, avg_len = self.k1, self.b, self.avg_len or 1.0
+        for token in set(tokenize(query)):
+            term_id = self.term_ids.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i in range(start, end):
+                doc_id = self.doc_ids[i]
+                tf = self.tfs[i]
+                norm = k1 * (1 - b + b * self.doc_lens[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
+
+    # Return the top-k passages for a query, in document order
+    def retrieve(self, query, k=5):
+        hits = sorted(doc_id for _, doc_id in self.search(query, k))
+        return [self.passages[doc_id] for doc_id in hits]
+
+    # Write the index to a directory
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ("offsets", "doc_ids", "tfs", "doc_lens"):
+            with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+                getattr(self, name).tofile(f)
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": self.terms, "passages": self.passages}, f)
+
+    # Read an index written by save()
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        buffers = {}
+        for name in ("offsets", "doc_ids", "tfs", "doc_lens"):
+            buffer = array("I")
+            with open(os.path.join(path, f"{name}.bin"), "rb") as f:
+                buffer.frombytes(f.read())
+            buffers[name] = buffer
+        return cls(meta["terms"], buffers["offsets"], buffers["doc_ids"], buffers["tfs"],
+                   buffers["doc_lens"], meta["passages"], meta["k1"], meta["b"])
+
+
+# Function to load the index for a document from disk, building and saving it on first use
+def index_for_text(text, root=INDEX_DIR):
+    path = os.path.join(root, document_hash(text))
+    if os.path.exists(os.path.join(path, "index.json")):
+        metrics.record_cache("bm25", True)
+        return BM25Index.load(path)
+    metrics.record_cache("bm25", False)
+    index = BM25Index.build(chunk_text(text, PASSAGE_CHARS))
+    index.save(path)
+    return index
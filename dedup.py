@@ -0,0 +1,83 @@
+# MinHash signatures and LSH banding for near-duplicate question detection.
+#
+# A question is reduced to the set of word 3-grams of its stem and options. Its
+# MinHash signature (NUM_PERM minimums of random linear hashes) estimates Jaccard
+# similarity between two such sets as the fraction of equal signature positions.
+# The signature is cut into BANDS bands; questions sharing any band are candidate
+# duplicates, so finding them is a handful of indexed bucket lookups instead of a
+# comparison against every stored question. Candidates are confirmed by comparing
+# signatures against THRESHOLD.
+#
+# With 128 permutations in 16 bands of 8 rows, pairs at Jaccard 0.8 become
+# candidates with probability ~0.97 and pairs at 0.5 with probability ~0.06.
+import hashlib
+import re
+import zlib
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.8
+SHINGLE_WORDS = 3
+
+# Prime just above 2**32, so (a * x + b) stays inside uint64 for 32-bit a, b and x
+_PRIME = np.uint64(4294967311)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# Function to turn a question into the text that is compared for duplicates
+def question_text(question):
+    return " ".join([question["stem"]] + list(question.get("options", [])))
+
+
+# Function to split text into hashed word shingles
+def shingles(text, size=SHINGLE_WORDS):
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) <= size:
+        grams = [" ".join(tokens)] if tokens else [""]
+    else:
+        grams = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return np.fromiter({zlib.crc32(gram.encode("utf-8")) for gram in grams}, dtype=np.uint64)
+
+
+# Class computing MinHash signatures and LSH band keys with fixed random permutations
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    # MinHash signature of a text as a uint64 vector
+    def signature(self, text):
+        hashed = shingles(text)
+        return ((np.outer(self.a, hashed) + self.b[:, None]) % _PRIME).min(axis=1)
+
+    # One signed 64-bit bucket key per band (fits an SQLite INTEGER)
+    def band_keys(self, signature):
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+
+# Function to estimate Jaccard similarity from two signatures
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+# Function to serialise a signature for storage
+def to_bytes(signature):
+    return signature.astype(np.uint64).tobytes()
+
+
+# Function to read a signature written by to_bytes()
+def from_bytes(data):
+    return np.frombuffer(data, dtype=np.uint64)
@@ -0,0 +1,174 @@
+# Drug-name entity index built with an Aho-Corasick automaton.
+#
+# All dictionary names are compiled into one automaton, so extracted text is
+# scanned once, in time linear in its length, however many names the dictionary
+# holds. Matching is case-insensitive and only whole words count ("atropine" in
+# "atropinic" is not a hit). Where names overlap, the longest match wins, so
+# "hyoscine butyl bromide" is not also reported as "hyoscine".
+#
+# The built-in dictionary covers the drugs and drug classes of the bundled corpus;
+# DRUG_DICTIONARY_PATH points at a file with one extra name per line.
+import os
+from collections import deque
+
+from pipeline import page_at
+
+DRUG_DICTIONARY_PATH = os.getenv("DRUG_DICTIONARY_PATH")
+
+DRUGS = """
+acebutolol acetazolamide acyclovir adenosine adrenaline albendazole alfuzosin alprazolam amantadine amiloride
+amiodarone amitriptyline amlodipine amodiaquine amoxicillin amphetamine amphotericin ampicillin artemether
+artesunate aspirin atenolol atomoxetine atropine azathioprine bambuterol benzhexol betaxolol bethanechol
+biperiden bisoprolol bromocriptine bupivacaine buspirone caffeine captopril carbamazepine carbidopa carbimazole
+carisoprodol carvedilol cefotaxime ceftriaxone celecoxib cetirizine chloramphenicol chlordiazepoxide chloroquine
+chlorpromazine chlorthalidone chlorzoxazone cinnarizine ciprofloxacin clarithromycin clindamycin clobazam
+clofazimine clomipramine clonazepam clonidine clotrimazole cloxacillin clozapine cocaine codeine colchicine
+cyclopentolate dantrolene dapsone diazepam diclofenac dicyclomine digoxin diltiazem dimenhydrinate diphenhydramine
+disopyramide dobutamine domperidone donepezil dopamine doxazosin doxycycline doxylamine enalapril ephedrine
+ergotamine erythromycin esmolol ethambutol ethosuximide felodipine fluconazole flucytosine flumazenil fluoxetine
+flecainide formoterol furosemide gabapentin ganciclovir gentamicin glibenclamide glimepiride glipizide
+glycopyrrolate griseofulvin guanethidine haloperidol halofantrine halothane homatropine hydralazine
+hydrochlorothiazide hydroxyzine hyoscine ibuprofen imipramine indapamide indomethacin insulin ipratropium
+isoniazid isoprenaline ketamine ketoconazole labetalol lamivudine lamotrigine levodopa lidocaine lignocaine
+lisinopril lithium loperamide lorazepam losartan lumefantrine mannitol mebendazole meclizine meclozine mefloquine
+metformin methimazole methyldopa metoclopramide metoprolol metronidazole mexiletine miconazole midazolam
+minoxidil moclobemide morphine naloxone neostigmine nifedipine nitrazepam nitroglycerin noradrenaline
+nystatin omeprazole ondansetron oxazepam oxybutynin oxyphenonium paracetamol pentazocine pethidine phenobarbitone
+phenoxybenzamine phentolamine phenylbutazone phenylephrine phenytoin physostigmine pilocarpine pindolol piroxicam
+pirenzepine prazosin prednisolone primaquine probenecid procainamide procaine prochlorperazine promethazine
+propantheline propranolol propylthiouracil pyrazinamide pyridostigmine pyrimethamine quinidine quinine ramipril
+ranitidine reserpine rifampicin risperidone ropinirole salbutamol salmeterol scopolamine selegiline sertraline
+sotalol spironolactone streptomycin succinylcholine sulfadoxine sulfasalazine sumatriptan tamsulosin terazosin
+terbinafine terbutaline tetracaine tetracycline theophylline thiopentone timolol tiotropium tolbutamide tramadol
+triamterene trihexyphenidyl trimethoprim tropicamide valproate vancomycin verapamil warfarin zidovudine zolpidem
+""".split() + [
+    "atropine methonitrate", "hyoscine butyl bromide", "ipratropium bromide", "tiotropium bromide",
+    "glyceryl trinitrate", "isosorbide dinitrate", "isosorbide mononitrate", "sodium nitroprusside",
+    "sodium valproate", "valproic acid", "benzathine penicillin", "penicillin",
+    "benzodiazepines", "barbiturates", "beta blockers", "calcium channel blockers", "ace inhibitors",
+    "mao inhibitors", "tricyclic antidepressants", "sulfonylureas", "sulfonamides", "fluoroquinolones",
+    "cephalosporins", "aminoglycosides", "macrolides", "tetracyclines", "thiazides", "opioids",
+]
+
+
+# Function to read the built-in dictionary plus any names in DRUG_DICTIONARY_PATH
+def load_dictionary(path=DRUG_DICTIONARY_PATH):
+    names = list(DRUGS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            names.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return sorted(set(name.lower() for name in names))
+
+
+# Class implementing the Aho-Corasick automaton over a fixed set of names
+class DrugMatcher:
+    def __init__(self, names=None):
+        self.names = list(names) if names is not None else load_dictionary()
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern_id, name in enumerate(self.names):
+            state = 0
+            for char in name.lower():
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(pattern_id)
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    # Return (start, end, name) for every whole-word, non-overlapping dictionary match
+    def scan(self, text):
+        lowered = text.lower()
+        goto, fail, output, names = self.goto, self.fail, self.output, self.names
+        matches = []
+        state = 0
+        for i, char in enumerate(lowered):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                start = i + 1 - len(names[pattern_id])
+                if (start == 0 or not lowered[start - 1].isalnum()) and (i + 1 == len(lowered) or not lowered[i + 1].isalnum()):
+                    matches.append((start, i + 1, names[pattern_id]))
+
+        # Keep the leftmost-longest match where names overlap
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        kept = []
+        last_end = -1
+        for match in matches:
+            if match[0] >= last_end:
+                kept.append(match)
+                last_end = match[1]
+        return kept
+
+
+_default_matcher = None
+
+
+# Function to get the matcher for the default dictionary, built once per process
+def default_matcher():
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = DrugMatcher()
+    return _default_matcher
+
+
+# Function to build {drug: [(page number, offset), ...]} for a text
+def build_entity_index(text, page_starts=None, matcher=None):
+    matcher = matcher or default_matcher()
+    index = {}
+    for start, _, name in matcher.scan(text):
+        page = page_at(page_starts, start) + 1 if page_starts else None
+        index.setdefault(name, []).append((page, start))
+    return index
+
+
+# Function to summarise mentions per drug, optionally with how many banked questions mention it
+def coverage(entity_index, questions=(), matcher=None):
+    matcher = matcher or default_matcher()
+    asked = {}
+    for question in questions:
+        text = " ".join([question["stem"]] + list(question.get("options", [])))
+        for name in {name for _, _, name in matcher.scan(text)}:
+            asked[name] = asked.get(name, 0) + 1
+    rows = [
+        {"drug": name, "mentions": len(hits), "pages": len({page for page, _ in hits}), "questions": asked.get(name, 0)}
+        for name, hits in entity_index.items()
+    ]
+    rows.sort(key=lambda row: (-row["mentions"], row["drug"]))
+    return rows
+
+
+# Function to gather the text around each mention of a drug, merging overlapping windows
+def drug_context(text, entity_index, drug, window=600, limit=8000):
+    spans = []
+    for _, offset in entity_index.get(drug, []):
+        start, end = max(offset - window, 0), min(offset + window, len(text))
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    parts = []
+    total = 0
+    for start, end in spans:
+        if total >= limit:
+            break
+        parts.append(text[start:end])
+        total += end - start
+    return "\n\n".join(parts)
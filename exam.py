@@ -0,0 +1,242 @@
+# Timed mock exams built from the question bank.
+#
+# A paper is assembled once, stratified so that every (chapter, difficulty) group
+# of the pool is represented in proportion to its size, and stored in the
+# question bank database. Papers are then held in an in-process cache: any
+# number of sessions sitting the same paper are served from that one copy, with
+# no LLM calls and no per-student question queries.
+#
+# Timing is enforced server-side: a session's deadline is fixed when it starts,
+# answers saved after the deadline are rejected, and grading only counts what was
+# saved in time. Grading is done in batch for every submitted session of a paper,
+# as one response matrix (see grading.py).
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import grading
+import question_bank
+
+# Grading and item analysis (which shows the answer key) are for examiners only; unset, nobody is an examiner
+EXAMINER_PASSWORD = os.getenv("EXAMINER_PASSWORD")
+# Fewer finished sessions than this give difficulty estimates too noisy to relabel questions with
+MIN_SESSIONS_FOR_DIFFICULTY = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exam_papers (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT,
+    title TEXT NOT NULL,
+    question_ids TEXT NOT NULL,
+    duration REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exam_sessions (
+    id TEXT PRIMARY KEY,
+    paper_id INTEGER NOT NULL,
+    student TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    deadline REAL NOT NULL,
+    submitted_at REAL,
+    answers TEXT NOT NULL DEFAULT '{}',
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS exam_sessions_paper ON exam_sessions (paper_id);
+"""
+
+
+# Function to check an examiner password against EXAMINER_PASSWORD
+def is_examiner(password, expected=EXAMINER_PASSWORD):
+    return bool(expected) and bool(password) and hmac.compare_digest(password.encode("utf-8"), expected.encode("utf-8"))
+
+
+# Function to choose n questions stratified by (chapter, difficulty), largest-remainder allocation
+def stratified_sample(questions, n, seed=None):
+    rng = random.Random(seed)
+    groups = {}
+    for question in questions:
+        groups.setdefault((question.get("chapter") or "", question.get("difficulty") or ""), []).append(question)
+    n = min(n, len(questions))
+    quotas = {key: n * len(group) / len(questions) for key, group in groups.items()}
+    counts = {key: int(quota) for key, quota in quotas.items()}
+    leftover = n - sum(counts.values())
+    for key in sorted(quotas, key=lambda k: quotas[k] - counts[k], reverse=True)[:leftover]:
+        counts[key] += 1
+    chosen = []
+    for key in sorted(groups):
+        chosen.extend(rng.sample(groups[key], counts[key]))
+    rng.shuffle(chosen)
+    return chosen
+
+
+# Class storing papers and sessions next to the question bank
+class ExamStore:
+    def __init__(self, bank):
+        self.bank = bank
+        self.papers = {}
+        self.lock = threading.Lock()
+        with bank.lock:
+            bank.conn.executescript(SCHEMA)
+
+    # Assemble a paper from a document's questions (or the whole bank) and store it
+    def create_paper(self, title, n_questions, duration_minutes, doc_hash=None, chapters=None, seed=None):
+        pool = [q for q in (self.bank.for_document(doc_hash) if doc_hash else self.bank.all_questions())
+                if q["options"] and q["answer"] and (not chapters or q["chapter"] in chapters)]
+        if not pool:
+            raise ValueError("no answerable questions to build a paper from")
+        chosen = stratified_sample(pool, n_questions, seed)
+        with self.bank.lock, self.bank.conn:
+            cursor = self.bank.conn.execute(
+                "INSERT INTO exam_papers (doc_hash, title, question_ids, duration, created_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_hash, title, json.dumps([q["id"] for q in chosen]), duration_minutes * 60.0, time.time()),
+            )
+        return cursor.lastrowid
+
+    # Paper with its questions, loaded from the database once per process
+    def paper(self, paper_id):
+        with self.lock:
+            cached = self.papers.get(paper_id)
+        if cached is not None:
+            return cached
+        with self.bank.lock:
+            row = self.bank.conn.execute(
+                "SELECT id, doc_hash, title, question_ids, duration FROM exam_papers WHERE id = ?", (paper_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"no exam paper {paper_id}")
+        questions = self.bank.get(json.loads(row[3]))
+        paper = {
+            "id": row[0],
+            "doc_hash": row[1],
+            "title": row[2],
+            "duration": row[4],
+            # Students see the questions without their answers
+            "questions": [dict(q, answer=None) for q in questions],
+            "key": [q["answer"] for q in questions],
+        }
+        with self.lock:
+            self.papers[paper_id] = paper
+        return paper
+
+    # List stored papers as (id, title) pairs, newest first
+    def list_papers(self):
+        with self.bank.lock:
+            return self.bank.conn.execute("SELECT id, title FROM exam_papers ORDER BY id DESC").fetchall()
+
+    # Start a session; the deadline is fixed here, on the server
+    def start(self, paper_id, student, now=None):
+        now = time.time() if now is None else now
+        paper = self.paper(paper_id)
+        session_id = uuid.uuid4().hex
+        with self.bank.lock, self.bank.conn:
+            self.bank.conn.execute(
+                "INSERT INTO exam_sessions (id, paper_id, student, started_at, deadline) VALUES (?, ?, ?, ?, ?)",
+                (session_id, paper_id, student, now, now + paper["duration"]),
+            )
+        return session_id
+
+    def session(self, session_id):
+        with self.bank.lock:
+            row = self.bank.conn.execute(
+                "SELECT id, paper_id, student, started_at, deadline, submitted_at, answers, score"
+                " FROM exam_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"no exam session {session_id}")
+        keys = ("id", "paper_id", "student", "started_at", "deadline", "submitted_at", "answers", "score")
+        session = dict(zip(keys, row))
+        session["answers"] = json.loads(session["answers"])
+        return session
+
+    # Seconds left before the deadline (0 once it has passed or the session is submitted)
+    def remaining(self, session_id, now=None):
+        now = time.time() if now is None else now
+        session = self.session(session_id)
+        if session["submitted_at"] is not None:
+            return 0.0
+        return max(session["deadline"] - now, 0.0)
+
+    # Save answers ({question position: option letter, or None to clear it}); optionally submit. Late saves are refused.
+    def save_answers(self, session_id, answers, submit=False, now=None):
+        now = time.time() if now is None else now
+        session = self.session(session_id)
+        if session["submitted_at"] is not None:
+            raise ValueError("this exam has already been submitted")
+        if now > session["deadline"]:
+            # Time is up: close the session with what was saved before the deadline
+            submit, answers = True, session["answers"]
+        merged = dict(session["answers"], **{str(k): v for k, v in answers.items()})
+        merged = {k: v for k, v in merged.items() if v is not None}
+        with self.bank.lock, self.bank.conn:
+            self.bank.conn.execute(
+                "UPDATE exam_sessions SET answers = ?, submitted_at = ? WHERE id = ?",
+                (json.dumps(merged), min(now, session["deadline"]) if submit else None, session_id),
+            )
+        return now <= session["deadline"]
+
+    def _finished(self, paper_id, now):
+        with self.bank.lock:
+            return self.bank.conn.execute(
+                "SELECT id, answers FROM exam_sessions WHERE paper_id = ? AND (submitted_at IS NOT NULL OR deadline < ?)"
+                " ORDER BY started_at",
+                (paper_id, now),
+            ).fetchall()
+
+    # Number of sessions of a paper that are still being sat (not submitted, deadline not passed)
+    def open_sessions(self, paper_id, now=None):
+        now = time.time() if now is None else now
+        with self.bank.lock:
+            return self.bank.conn.execute(
+                "SELECT COUNT(*) FROM exam_sessions WHERE paper_id = ? AND submitted_at IS NULL AND deadline >= ?",
+                (paper_id, now),
+            ).fetchone()[0]
+
+    # Grade every submitted or expired session of a paper in one pass; returns {session_id: score}
+    def grade_paper(self, paper_id, now=None):
+        now = time.time() if now is None else now
+        paper = self.paper(paper_id)
+        rows = self._finished(paper_id, now)
+        responses = grading.response_matrix([json.loads(answers) for _, answers in rows], len(paper["key"]))
+        _, scores = grading.score(responses, grading.key_vector(paper["key"]))
+        scores = {session_id: float(score) for (session_id, _), score in zip(rows, scores)}
+        with self.bank.lock, self.bank.conn:
+            self.bank.conn.executemany(
+                "UPDATE exam_sessions SET score = ?, submitted_at = COALESCE(submitted_at, deadline) WHERE id = ?",
+                [(score, session_id) for session_id, score in scores.items()],
+            )
+        return scores
+
+    # Item statistics for a paper over its finished sessions (see grading.item_analysis)
+    def analyze_paper(self, paper_id, now=None):
+        now = time.time() if now is None else now
+        paper = self.paper(paper_id)
+        rows = self._finished(paper_id, now)
+        responses = grading.response_matrix([json.loads(answers) for _, answers in rows], len(paper["key"]))
+        return grading.item_analysis(responses, grading.key_vector(paper["key"]))
+
+    # Relabel the paper's questions easy/medium/hard from how students actually did
+    def apply_difficulty(self, paper_id, analysis):
+        if len(analysis["scores"]) < MIN_SESSIONS_FOR_DIFFICULTY:
+            return 0
+        paper = self.paper(paper_id)
+        updates = [(grading.difficulty_label(float(p)), q["id"]) for q, p in zip(paper["questions"], analysis["difficulty"])]
+        with self.bank.lock, self.bank.conn:
+            self.bank.conn.executemany("UPDATE questions SET difficulty = ? WHERE id = ?", updates)
+        return len(updates)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+# Function to get the process-wide exam store over the default question bank
+def default_store():
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ExamStore(question_bank.default_bank())
+        return _default_store
@@ -0,0 +1,139 @@
+# Figure and table caption index with cross-references.
+#
+# Captions ("Fig. 29.1: A normal sleep cycle", "TABLE 45.2 Types of primary
+# hyperlipoproteinaemias") and in-text references ("(Fig. 39.2)", "given in
+# Table 10.1", even "site II, Fig.\n41.1" broken across lines) are found by one
+# compiled alternation scanned once over the extracted text, caption branches
+# first so a caption line is not also counted as a reference. The result maps
+# "Fig. 29.1" / "Table 10.1" to the caption, its page and the offsets of every
+# reference, as plain JSON-friendly dicts so it can travel in a job result and
+# be built once per extraction.
+#
+# figure_region() then finds the caption on its PDF page and grows a clip
+# rectangle over the images and vector drawings next to it (above a figure
+# caption, below a table caption, starting from the table tables.py detects
+# there), so a figure can be shown or sent along with
+# questions without rescanning the document.
+import re
+
+import fitz
+
+import tables
+from pipeline import page_at
+
+# Graphics this close (in points) to the caption or to each other belong to the same figure
+REGION_GAP = 24
+REGION_DPI = 150
+CONTEXT_CHARS = 400
+
+_MARKERS = re.compile(
+    r"(?P<figure>^[ \t]*Fig(?:ure)?\.?[ \t]*(?P<figure_number>\d+\.\d+)[ \t]*:[ \t]*(?P<figure_caption>[^\n]*))"
+    r"|(?P<table>TABLE[ \t]+(?P<table_number>\d+\.\d+)[ \t]+(?P<table_caption>[A-Z][^\n]*))"
+    r"|(?P<reference>\b(?P<reference_kind>Fig(?:ure)?s?\.?|Tables?)\s*(?P<reference_number>\d+\.\d+))",
+    re.MULTILINE,
+)
+
+
+# Function to make the index key for a figure or table ("Fig. 29.1", "Table 10.1")
+def figure_key(kind, number):
+    return f"{'Fig.' if kind == 'figure' else 'Table'} {number}"
+
+
+# Function to build {key: {"kind", "number", "caption", "page", "offset", "references": [[page, offset], ...]}} for a text
+def build_figure_index(text, page_starts=None):
+    index = {}
+
+    def entry(kind, number):
+        return index.setdefault(figure_key(kind, number), {
+            "kind": kind, "number": number, "caption": None, "page": None, "offset": None, "references": [],
+        })
+
+    for match in _MARKERS.finditer(text):
+        start = match.start()
+        page = page_at(page_starts, start) + 1 if page_starts else None
+        if match.group("reference"):
+            kind = "table" if match.group("reference_kind").lower().startswith("table") else "figure"
+            entry(kind, match.group("reference_number"))["references"].append([page, start])
+            continue
+        kind = "figure" if match.group("figure") else "table"
+        found = entry(kind, match.group(f"{kind}_number"))
+        if found["caption"] is None:
+            found.update(caption=match.group(f"{kind}_caption").strip(), page=page, offset=match.start(f"{kind}_number"))
+    return index
+
+
+# Function to gather the text around each reference to a figure, merging overlapping windows
+def reference_context(text, entry, window=CONTEXT_CHARS):
+    spans = []
+    for _, offset in entry["references"]:
+        start = text.rfind("\n\n", 0, max(offset - window, 0))
+        start = max(offset - window, 0) if start < 0 else start + 2
+        end = min(offset + window, len(text))
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return [text[start:end].strip() for start, end in spans]
+
+
+# Function to find the bounding box of an entry's caption line on a PyMuPDF page, or None
+def _caption_rect(page, entry):
+    words = page.get_text("words")
+    for i, word in enumerate(words):
+        if not word[4].startswith(entry["number"]) or i == 0:
+            continue
+        label = words[i - 1][4]
+        if entry["kind"] == "figure":
+            rest = word[4][len(entry["number"]):] + (words[i + 1][4] if i + 1 < len(words) else "")
+            if not (label in ("Fig.", "Fig", "Figure") and rest.startswith(":")):
+                continue
+        elif not label.endswith("TABLE"):
+            continue
+        line = [w for w in words if w[5:7] == word[5:7]]
+        return fitz.Rect(min(w[0] for w in line), min(w[1] for w in line), max(w[2] for w in line), max(w[3] for w in line))
+    return None
+
+
+# Function to find the clip rectangle of a figure (graphics above its caption) or table (below it) on its page
+def figure_region(path, entry):
+    if entry["page"] is None:
+        return None
+    with fitz.open(path) as doc:
+        if not 0 < entry["page"] <= doc.page_count:
+            return None
+        page = doc.load_page(entry["page"] - 1)
+        caption = _caption_rect(page, entry)
+        if caption is None:
+            return None
+        area = page.rect.width * page.rect.height
+        graphics = [fitz.Rect(info["bbox"]) for info in page.get_image_info()]
+        graphics += [fitz.Rect(drawing["rect"]) for drawing in page.get_drawings()]
+        # Rules are zero-height rectangles: give them some thickness. Page backgrounds and frames are not figures.
+        graphics = [rect + (-0.5, -0.5, 0.5, 0.5) for rect in graphics if rect.is_valid]
+        graphics = [rect for rect in graphics if rect.width * rect.height < 0.9 * area]
+        if entry["kind"] == "figure":
+            graphics = [rect for rect in graphics if rect.y1 <= caption.y1]
+        else:
+            graphics = [rect for rect in graphics if rect.y0 >= caption.y0]
+        region = fitz.Rect(caption)
+        if entry["kind"] == "table":
+            below = [table.bbox for table in tables.detect_tables(page, page.number) if table.bbox[1] >= caption.y0]
+            if below:
+                region |= min(below, key=lambda bbox: bbox[1])
+        grown = True
+        while grown:
+            grown = False
+            reach = fitz.Rect(region.x0 - REGION_GAP, region.y0 - REGION_GAP, region.x1 + REGION_GAP, region.y1 + REGION_GAP)
+            for rect in graphics:
+                if rect.intersects(reach) and not region.contains(rect):
+                    region |= rect
+                    grown = True
+        return region & page.rect
+
+
+# Function to render a figure's region as PNG bytes (the whole page when no region is found)
+def render_region(path, entry, dpi=REGION_DPI):
+    region = figure_region(path, entry)
+    with fitz.open(path) as doc:
+        page = doc.load_page(entry["page"] - 1)
+        return page.get_pixmap(dpi=dpi, clip=region).tobytes("png")
@@ -0,0 +1,119 @@
+# PDF text extraction with symbol-glyph recovery (PyMuPDF backend).
+#
+# Textbooks set Greek letters, arrows and math signs in symbol fonts (Symbol,
+# SymbolMT, MT Extra, ...) that often carry no ToUnicode map. PyPDF2 then drops
+# those glyphs or returns the raw codes, so "α2 receptors on β cells" comes out
+# as "2 receptors on  cells" and "→" vanishes. PyMuPDF reports every span with
+# its font, so we can tell which codes are symbol-font codes and map them back
+# through the Adobe Symbol encoding.
+#
+# Each font gets one translation table, built the first time the font is seen
+# and cached by (font name, has ToUnicode) for the life of the process; spans
+# are then translated with str.translate, so there is no per-character Python
+# work. Fonts with a ToUnicode map are trusted as they are. Text in any font
+# that lands in the Private Use Area (symbolic TrueType fonts map their codes to
+# U+F020-U+F0FF) is mapped as well.
+import re
+import threading
+
+import fitz
+
+import metrics
+
+# Adobe Symbol encoding: font code -> Unicode, for the codes that matter in pharmacology text
+SYMBOL_ENCODING = {
+    0x22: "∀", 0x24: "∃", 0x27: "∋", 0x2A: "∗", 0x2D: "−", 0x40: "≅", 0x5C: "∴", 0x5E: "⊥", 0x7E: "∼",
+    0x41: "Α", 0x42: "Β", 0x43: "Χ", 0x44: "Δ", 0x45: "Ε", 0x46: "Φ", 0x47: "Γ", 0x48: "Η", 0x49: "Ι",
+    0x4A: "ϑ", 0x4B: "Κ", 0x4C: "Λ", 0x4D: "Μ", 0x4E: "Ν", 0x4F: "Ο", 0x50: "Π", 0x51: "Θ", 0x52: "Ρ",
+    0x53: "Σ", 0x54: "Τ", 0x55: "Υ", 0x56: "ς", 0x57: "Ω", 0x58: "Ξ", 0x59: "Ψ", 0x5A: "Ζ",
+    0x61: "α", 0x62: "β", 0x63: "χ", 0x64: "δ", 0x65: "ε", 0x66: "φ", 0x67: "γ", 0x68: "η", 0x69: "ι",
+    0x6A: "ϕ", 0x6B: "κ", 0x6C: "λ", 0x6D: "μ", 0x6E: "ν", 0x6F: "ο", 0x70: "π", 0x71: "θ", 0x72: "ρ",
+    0x73: "σ", 0x74: "τ", 0x75: "υ", 0x76: "ϖ", 0x77: "ω", 0x78: "ξ", 0x79: "ψ", 0x7A: "ζ",
+    0xA1: "ϒ", 0xA2: "′", 0xA3: "≤", 0xA4: "⁄", 0xA5: "∞", 0xA6: "ƒ", 0xA7: "♣", 0xA8: "♦", 0xA9: "♥",
+    0xAA: "♠", 0xAB: "↔", 0xAC: "←", 0xAD: "↑", 0xAE: "→", 0xAF: "↓", 0xB0: "°", 0xB1: "±", 0xB2: "″",
+    0xB3: "≥", 0xB4: "×", 0xB5: "∝", 0xB6: "∂", 0xB7: "•", 0xB8: "÷", 0xB9: "≠", 0xBA: "≡", 0xBB: "≈",
+    0xBC: "…", 0xC5: "⊕", 0xC6: "∅", 0xC7: "∩", 0xC8: "∪", 0xD1: "∇", 0xD6: "√", 0xD7: "⋅", 0xD8: "¬",
+    0xD9: "∧", 0xDA: "∨", 0xDB: "⇔", 0xDC: "⇐", 0xDD: "⇑", 0xDE: "⇒", 0xDF: "⇓", 0xE0: "◊", 0xE5: "∑",
+    0xF2: "∫",
+}
+# Symbolic TrueType fonts put their codes at U+F000 + code
+PRIVATE_USE_OFFSET = 0xF000
+
+# Font names whose plain codes are Symbol-encoded
+_SYMBOL_FONT = re.compile(r"symbol|mt-?extra|greek|mathpi", re.IGNORECASE)
+
+# Translation table for text in fonts that are not symbol fonts: only Private Use Area codes are mapped
+_PRIVATE_USE_TABLE = {PRIVATE_USE_OFFSET + code: char for code, char in SYMBOL_ENCODING.items()}
+_SYMBOL_TABLE = {**_PRIVATE_USE_TABLE, **SYMBOL_ENCODING}
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+# Function to strip a subset prefix from a font name ("ABCDEF+SymbolMT" -> "SymbolMT")
+def base_font_name(name):
+    return name.split("+", 1)[-1]
+
+
+# Function to get the cached translation table for a font (None when its text can be used as is)
+def font_table(name, has_to_unicode):
+    key = (base_font_name(name), has_to_unicode)
+    table = _tables.get(key)
+    if table is None and key not in _tables:
+        if has_to_unicode:
+            table = None
+        elif _SYMBOL_FONT.search(key[0]):
+            table = _SYMBOL_TABLE
+        else:
+            table = _PRIVATE_USE_TABLE
+        with _tables_lock:
+            _tables[key] = table
+    return table
+
+
+# Function to map the fonts used on a page to their translation tables, looking each font's ToUnicode up once
+def _page_tables(doc, page, seen):
+    tables = {}
+    for xref, _, _, basefont, _, _ in page.get_fonts():
+        if xref not in seen:
+            has_to_unicode = doc.xref_get_key(xref, "ToUnicode")[0] != "null"
+            seen[xref] = font_table(basefont, has_to_unicode)
+        tables[basefont] = tables[base_font_name(basefont)] = seen[xref]
+    return tables
+
+
+# Function to extract one page's text span by span, translating symbol-font codes
+def page_text(page, tables):
+    lines = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block["lines"]:
+            parts = []
+            for span in line["spans"]:
+                table = tables.get(span["font"], _PRIVATE_USE_TABLE)
+                parts.append(span["text"].translate(table) if table else span["text"])
+            lines.append("".join(parts))
+    return "\n".join(lines)
+
+
+# Function to open a PDF from a spooled path (MuPDF reads it from disk on demand) or from a file object
+def open_document(file):
+    if isinstance(file, str):
+        return fitz.open(file, filetype="pdf")
+    file.seek(0)
+    return fitz.open(stream=file.read(), filetype="pdf")
+
+
+# Function to extract the text of each page of a PDF (path or file object), optionally reporting progress(done, total).
+# With page_numbers, only those pages are loaded and the others are returned as "".
+def extract_pages(file, progress=None, page_numbers=None):
+    with open_document(file) as doc:
+        seen = {}
+        wanted = range(doc.page_count) if page_numbers is None else [i for i in page_numbers if 0 <= i < doc.page_count]
+        pages = [""] * doc.page_count
+        for done, i in enumerate(wanted, 1):
+            page = doc.load_page(i)
+            pages[i] = page_text(page, _page_tables(doc, page, seen))
+            metrics.PAGES_EXTRACTED.inc()
+            if progress:
+                progress(done, len(wanted))
+    return pages
@@ -0,0 +1,110 @@
+# Vectorized grading and item analysis for mock exams.
+#
+# Responses are held as one int8 matrix (students x questions) of chosen option
+# indexes, with NO_ANSWER for blanks, so scoring and every item statistic are
+# whole-matrix NumPy operations rather than per-student loops. 1,000 students x
+# 200 questions is a 200 KB matrix and the full analysis takes a few milliseconds.
+import numpy as np
+
+LETTERS = "abcde"
+NO_ANSWER = -1
+# Key value for questions without a recorded answer, so nothing matches them
+NO_KEY = -2
+# Share of students in each of the upper and lower groups for the discrimination index
+GROUP_FRACTION = 0.27
+
+
+# Function to turn answer dicts ({position: letter}) into a students x questions matrix
+def response_matrix(answer_sets, n_questions):
+    responses = np.full((len(answer_sets), n_questions), NO_ANSWER, dtype=np.int8)
+    for row, answers in enumerate(answer_sets):
+        for position, letter in answers.items():
+            position = int(position)
+            if 0 <= position < n_questions and letter and letter in LETTERS:
+                responses[row, position] = LETTERS.index(letter)
+    return responses
+
+
+# Function to turn answer letters into option indexes
+def key_vector(key):
+    return np.array([LETTERS.index(letter) if letter and letter in LETTERS else NO_KEY for letter in key], dtype=np.int8)
+
+
+# Function to mark every response at once; returns (correct matrix, fraction correct per student)
+def score(responses, key):
+    correct = responses == key[None, :]
+    scores = correct.mean(axis=1) if responses.shape[1] else np.zeros(len(responses))
+    return correct, scores
+
+
+# Function to compute per-item statistics: difficulty, discrimination, point-biserial and distractor counts
+def item_analysis(responses, key, n_options=len(LETTERS)):
+    correct, scores = score(responses, key)
+    n_students, n_items = responses.shape
+    totals = correct.sum(axis=1)
+    correct_f = correct.astype(np.float64)
+
+    # Difficulty index: share of students answering the item correctly
+    difficulty = correct_f.mean(axis=0) if n_students else np.zeros(n_items)
+
+    # Discrimination index: upper-group minus lower-group difficulty, groups ranked by total score
+    order = np.argsort(totals, kind="stable")
+    group = max(int(round(n_students * GROUP_FRACTION)), 1) if n_students else 0
+    lower = order[:group]
+    upper = order[n_students - group:]
+    if group:
+        discrimination = correct_f[upper].mean(axis=0) - correct_f[lower].mean(axis=0)
+    else:
+        discrimination = np.zeros(n_items)
+
+    # Point-biserial correlation between the item and the rest of the test (item removed from the total)
+    rest = totals[:, None] - correct_f
+    item_centered = correct_f - difficulty
+    rest_centered = rest - rest.mean(axis=0) if n_students else rest
+    denominator = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        point_biserial = np.where(denominator > 0, (item_centered * rest_centered).sum(axis=0) / denominator, 0.0)
+
+    # Distractor analysis: how many students picked each option (last column = blank), overall and by group
+    def option_counts(rows):
+        chosen = np.where(rows == NO_ANSWER, n_options, rows).astype(np.int64)
+        flat = chosen + np.arange(n_items)[None, :] * (n_options + 1)
+        return np.bincount(flat.ravel(), minlength=n_items * (n_options + 1)).reshape(n_items, n_options + 1)
+
+    return {
+        "scores": scores,
+        "difficulty": difficulty,
+        "discrimination": discrimination,
+        "point_biserial": point_biserial,
+        "option_counts": option_counts(responses),
+        "upper_option_counts": option_counts(responses[upper]),
+        "lower_option_counts": option_counts(responses[lower]),
+    }
+
+
+# Function to flatten an item analysis into one row per question for display
+def item_rows(analysis, key, n_options=len(LETTERS)):
+    rows = []
+    for i, letter in enumerate(key):
+        counts = analysis["option_counts"][i]
+        row = {
+            "question": i + 1,
+            "key": letter,
+            "difficulty": round(float(analysis["difficulty"][i]), 3),
+            "discrimination": round(float(analysis["discrimination"][i]), 3),
+            "point_biserial": round(float(analysis["point_biserial"][i]), 3),
+            "blank": int(counts[n_options]),
+        }
+        for option in range(n_options):
+            row[LETTERS[option]] = int(counts[option])
+        rows.append(row)
+    return rows
+
+
+# Function to map an empirical difficulty index onto the bank's easy/medium/hard labels
+def difficulty_label(p_correct):
+    if p_correct >= 0.7:
+        return "easy"
+    if p_correct <= 0.3:
+        return "hard"
+    return "medium"
@@ -0,0 +1,219 @@
+# Durable job queue for extraction, OCR and MCQ generation.
+#
+# Jobs are rows in a local SQLite database (WAL mode), so they outlive the
+# Streamlit session or API request that created them: worker processes
+# (worker.py) claim and run them, and any session can reattach to a job by its
+# id to follow its progress or pick up its result.
+#
+# Claiming is one BEGIN IMMEDIATE transaction, so two workers never take the same
+# job. The highest priority runnable job goes first, oldest first within a
+# priority. Running jobs carry a heartbeat; a job whose worker stops heartbeating
+# for LEASE_SECONDS is treated as crashed and handed out again. Failed attempts
+# are retried with exponential backoff until max_attempts is reached.
+#
+# Uploaded files are spooled to SPOOL_DIR and jobs carry their path, which keeps
+# the database small and lets workers open the file directly.
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+import spool
+
+DB_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join("data", "jobs.db"))
+SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join("data", "spool"))
+# A running job whose worker has not heartbeated for this long is given to another worker
+LEASE_SECONDS = 120.0
+# Workers heartbeat this often while a job runs, whether or not its handler reports progress
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+RETRY_DELAY = 5.0
+MAX_ATTEMPTS = 3
+
+# Priorities: interactive work ahead of bulk work
+PRIORITY_BULK = 0
+PRIORITY_NORMAL = 5
+PRIORITY_INTERACTIVE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after REAL NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    heartbeat REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_runnable ON jobs (status, priority DESC, created_at);
+"""
+
+_COLUMNS = (
+    "id", "kind", "payload", "priority", "status", "attempts", "max_attempts", "run_after", "progress",
+    "message", "result", "error", "worker", "heartbeat", "created_at", "started_at", "finished_at",
+)
+
+
+# Class wrapping the jobs database; one instance per process (each opens its own connection)
+class JobQueue:
+    def __init__(self, path=DB_PATH, spool_dir=SPOOL_DIR):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.spool_dir = spool_dir
+        self.lock = threading.Lock()
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    # Copy an upload (bytes or a file object, a chunk at a time) into the spool directory and return its path
+    def spool(self, source, suffix=""):
+        return spool.spool_upload(source, suffix, self.spool_dir)
+
+    # Add a job and return its id
+    def enqueue(self, kind, payload, priority=PRIORITY_NORMAL, max_attempts=MAX_ATTEMPTS):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, kind, payload, priority, max_attempts, run_after, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), priority, max_attempts, now, now),
+            )
+        return job_id
+
+    # Take the next runnable job for this worker, or None; crashed workers' jobs are reclaimed here
+    def claim(self, worker, kinds=None, now=None):
+        now = time.time() if now is None else now
+        kind_filter = ""
+        params = [now, now - LEASE_SECONDS]
+        if kinds:
+            kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A job whose worker died on its last attempt is not handed out again (it may be what kills workers)
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?,"
+                    " error = COALESCE(error || '; ', '') || 'worker lost on the last attempt (lease expired)'"
+                    " WHERE status = 'running' AND heartbeat < ? AND attempts >= max_attempts",
+                    (now, now - LEASE_SECONDS),
+                )
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND heartbeat < ?))"
+                    + kind_filter + " ORDER BY priority DESC, created_at LIMIT 1",
+                    params,
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, heartbeat = ?,"
+                    " started_at = ?, progress = 0, message = NULL WHERE id = ?",
+                    (worker, now, now, row[0]),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    # Record progress (0..1) and a status message; doubles as the worker's heartbeat
+    def progress(self, job_id, fraction, message=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, heartbeat = ? WHERE id = ? AND status = 'running'",
+                (fraction, message, time.time(), job_id),
+            )
+
+    # Extend a running job's lease without touching its progress
+    def heartbeat(self, job_id, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'", (now, job_id))
+
+    def complete(self, job_id, result):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, result = ?, error = NULL, finished_at = ?"
+                " WHERE id = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    # Record a failed attempt: requeue with backoff, or mark failed once attempts run out
+    def fail(self, job_id, error, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET error = ?,"
+                " status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,"
+                " run_after = ? + ? * (1 << (attempts - 1)),"
+                " finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END"
+                " WHERE id = ? AND status = 'running'",
+                (str(error), now, RETRY_DELAY, now, job_id),
+            )
+
+    # Job as a dict (payload and result decoded), or None for an unknown id
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    # Counts of jobs per status, e.g. for a queue-depth gauge
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    # Delete finished jobs older than max_age seconds, with their spooled files
+    def purge(self, max_age, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, payload FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - max_age,)
+            ).fetchall()
+            self.conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id, _ in rows])
+        for _, payload in rows:
+            path = json.loads(payload).get("path")
+            if path and os.path.exists(path):
+                os.remove(path)
+        return len(rows)
+
+
+# Function to set the jobs queue-depth gauge from the database at every metrics scrape, so it
+# follows workers draining the queue and not just submissions from this process
+def export_depth(queue):
+    metrics.add_collector(lambda: metrics.QUEUE_DEPTH.set(queue.counts().get("queued", 0), queue="jobs"))
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+# Function to get the process-wide queue at DB_PATH
+def default_queue():
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+            export_depth(_default_queue)
+        return _default_queue
@@ -0,0 +1,147 @@
+# Extractive key-sentence selection to shrink generation prompts.
+#
+# A chapter sent whole to generate_mcqs spends most of its tokens on narrative
+# filler. Here the text is cut into sentences and each block of BLOCK_SENTENCES
+# sentences is ranked with TextRank: sentences become rows of a TF-IDF matrix
+# (SciPy CSR, log term frequency, smoothed idf, rows L2-normalised), their cosine
+# similarities X @ X.T form the graph, and the stationary scores come from power
+# iteration on the row-normalised graph. Sentences carrying numbers (doses,
+# durations, percentages) get a boost, since those are what questions ask about.
+#
+# The highest-scoring sentences are then taken greedily until the block's share
+# of the token budget is spent, skipping near-repeats of a sentence already
+# taken, and are emitted in their original order. Ranking per block keeps the
+# similarity matrix small and spreads the selection over the whole chapter
+# rather than letting one dense section take the entire budget. When nothing fits
+# (one sentence longer than the whole budget, or only headings), the top-ranked
+# sentence is cut to the budget instead, so non-empty text never comes back empty.
+import math
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+from bm25 import tokenize
+from profiling import timed
+
+# Default prompt reduction: keep about 1/REDUCTION_FACTOR of the tokens
+REDUCTION_FACTOR = float(os.getenv("PROMPT_REDUCTION", "3"))
+CHARS_PER_TOKEN = 4
+BLOCK_SENTENCES = 400
+DAMPING = 0.85
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 100
+# Sentences with fewer index terms (headings, list labels) are never selected on their own
+MIN_TERMS = 4
+# A sentence this similar (cosine) to one already selected is skipped
+REDUNDANCY = 0.7
+FACT_BOOST = 0.5
+
+_SENTENCE = re.compile(r"\S.*?(?:[.!?](?=\s|$)|\n\s*\n|$)", re.DOTALL)
+_DIGIT = re.compile(r"\d")
+
+
+# Function to estimate the prompt tokens a text costs
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# Function to split text into sentence (start, end) offsets
+def split_sentences(text):
+    return [match.span() for match in _SENTENCE.finditer(text)]
+
+
+# Function to build the L2-normalised TF-IDF matrix (sentences x terms) and each sentence's term count
+def tfidf_matrix(sentences):
+    vocabulary = {}
+    rows = []
+    cols = []
+    for row, sentence in enumerate(sentences):
+        for term in tokenize(sentence):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(term, len(vocabulary)))
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(sentences), max(len(vocabulary), 1)),
+    )
+    counts.sum_duplicates()
+    terms = np.diff(counts.indptr)
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = (np.log((1 + len(sentences)) / (1 + df)) + 1).astype(np.float32)
+    counts.data = np.log1p(counts.data) * idf[counts.indices]
+    norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+    return sparse.diags(1 / np.maximum(norms, 1e-12)) @ counts, terms
+
+
+# Function to score the nodes of a similarity graph with TextRank (power iteration)
+def textrank(similarity, damping=DAMPING):
+    n = similarity.shape[0]
+    graph = sparse.csr_matrix(similarity)
+    # Drop self-similarity without setdiag, which changes the CSR sparsity structure in place
+    graph = (graph - sparse.diags(graph.diagonal())).tocsr()
+    graph.eliminate_zeros()
+    out_weight = np.asarray(graph.sum(axis=1)).ravel()
+    transition = (sparse.diags(1 / np.where(out_weight > 0, out_weight, 1)) @ graph).T.tocsr()
+    scores = np.full(n, 1 / n)
+    for _ in range(MAX_ITERATIONS):
+        updated = damping * (transition @ scores)
+        # Teleport plus the mass of sentences with no similar neighbour, spread evenly
+        updated += (1 - updated.sum()) / n
+        converged = np.abs(updated - scores).sum() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+# Function to pick the indexes of a block's key sentences within a token budget, and the top-ranked one
+def _select_block(sentences, budget):
+    matrix, terms = tfidf_matrix(sentences)
+    similarity = (matrix @ matrix.T).tocsr()
+    scores = textrank(similarity)
+    scores *= 1 + FACT_BOOST * np.array([bool(_DIGIT.search(sentence)) for sentence in sentences])
+    chosen = []
+    used = 0
+    ranked = np.argsort(-scores, kind="stable")
+    for i in ranked:
+        cost = estimate_tokens(sentences[i])
+        if terms[i] < MIN_TERMS or used + cost > budget:
+            continue
+        if chosen and similarity[i].toarray().ravel()[chosen].max() > REDUNDANCY:
+            continue
+        chosen.append(i)
+        used += cost
+    return sorted(chosen), used, ranked[0]
+
+
+# Function to shrink text to its key sentences: within budget tokens, or about 1/factor of its tokens
+@timed("key_sentences")
+def select_key_sentences(text, budget=None, factor=REDUCTION_FACTOR):
+    total = estimate_tokens(text)
+    budget = total / factor if budget is None else budget
+    if total <= budget:
+        return text
+    spans = split_sentences(text)
+    selected = []
+    top = None
+    carry = 0.0
+    for block_start in range(0, len(spans), BLOCK_SENTENCES):
+        block = spans[block_start:block_start + BLOCK_SENTENCES]
+        # Each block gets its share of the budget, plus whatever earlier blocks left unspent
+        share = budget * (block[-1][1] - block[0][0]) / len(text) + carry
+        chosen, used, best = _select_block([text[start:end] for start, end in block], share)
+        carry = share - used
+        selected.extend(block[i] for i in chosen)
+        if top is None:
+            top = block[best]
+    if not selected:
+        if top is None:
+            return text
+        # Cut the first block's top-ranked sentence to the budget, at a word boundary when there is one
+        start, end = top
+        limit = start + int(max(budget, 1) * CHARS_PER_TOKEN)
+        if limit < end:
+            space = text.rfind(" ", start, limit)
+            end = space if space > start else limit
+        return text[start:end].strip()
+    return "\n".join(text[start:end] for start, end in selected)
@@ -0,0 +1,157 @@
+# Append-only ledger of LLM calls: tokens, latency and cost per user, document and provider.
+#
+# generate_mcqs records one row per completion request (failed requests too, with
+# no tokens) into the usage table of a local SQLite database. Rows are never
+# changed: triggers abort any UPDATE or DELETE, so the ledger stays an audit
+# trail of spend. Cost is computed at insert time from the per-1K-token prices in
+# PRICES (override with LLM_PRICES='{"model": [prompt, completion]}'), so later
+# price changes do not rewrite history. Providers in UNBILLED_PROVIDERS (the
+# benchmark mock, journal replay, the offline batch stand-in) are recorded with
+# their tokens but cost nothing. A call recorded with a call_id (a batch result's
+# id) is booked at most once, so ingesting the same results again adds no rows.
+#
+# summary() aggregates the ledger by document, user, provider, model, day or
+# prompt size bucket. The prompt size view is the one for tuning chunk sizes: it
+# shows completion tokens per second and per dollar for each size of prompt sent.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+LEDGER_PATH = os.getenv("LEDGER_PATH", os.path.join("data", "ledger.db"))
+
+# USD per 1K tokens: (prompt, completion)
+PRICES = {
+    "text-davinci-003": (0.02, 0.02),
+    "gpt-3.5-turbo-instruct": (0.0015, 0.002),
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-4": (0.03, 0.06),
+}
+PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+# Completion functions that never reach a billing provider
+UNBILLED_PROVIDERS = {"mock", "replay", "batch-stand-in"}
+# Width of the prompt size buckets in summary(group_by="prompt_chars")
+PROMPT_BUCKET_CHARS = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    user TEXT,
+    doc_hash TEXT,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_chars INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL,
+    cost REAL NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    call_id TEXT
+);
+CREATE INDEX IF NOT EXISTS usage_created ON usage (created_at);
+CREATE INDEX IF NOT EXISTS usage_doc ON usage (doc_hash, created_at);
+CREATE INDEX IF NOT EXISTS usage_user ON usage (user, created_at);
+CREATE TRIGGER IF NOT EXISTS usage_no_update BEFORE UPDATE ON usage BEGIN
+    SELECT RAISE(ABORT, 'the usage ledger is append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS usage_no_delete BEFORE DELETE ON usage BEGIN
+    SELECT RAISE(ABORT, 'the usage ledger is append-only');
+END;
+"""
+
+# summary() groupings: name -> SQL expression
+GROUPS = {
+    "document": "doc_hash",
+    "user": "user",
+    "provider": "provider",
+    "model": "model",
+    "day": "date(created_at, 'unixepoch')",
+    "prompt_chars": f"CAST(prompt_chars / {PROMPT_BUCKET_CHARS} AS INTEGER) * {PROMPT_BUCKET_CHARS}",
+}
+
+
+# Function to price a call in USD (0 for models without a known price)
+def cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+# Class wrapping one SQLite connection to the ledger, shared by the threads of a process
+class Ledger:
+    def __init__(self, path=LEDGER_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if "call_id" not in {row[1] for row in self.conn.execute("PRAGMA table_info(usage)")}:
+            # Ledgers created before calls could carry an id
+            self.conn.execute("ALTER TABLE usage ADD COLUMN call_id TEXT")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS usage_call ON usage (call_id)")
+
+    def close(self):
+        self.conn.close()
+
+    # Append one call to the ledger; returns its cost, or None when call_id is already booked.
+    # price_factor scales list prices (batch endpoints are discounted).
+    def record(self, provider, model, prompt_tokens, completion_tokens, latency, user=None, doc_hash=None,
+               prompt_chars=0, failed=False, now=None, price_factor=1.0, call_id=None):
+        price = 0.0 if provider in UNBILLED_PROVIDERS else cost(model, prompt_tokens, completion_tokens) * price_factor
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO usage (created_at, user, doc_hash, provider, model, prompt_chars, prompt_tokens,"
+                " completion_tokens, latency, cost, failed, call_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (call_id) DO NOTHING",
+                (time.time() if now is None else now, user, doc_hash, provider, model, prompt_chars, prompt_tokens,
+                 completion_tokens, latency, price, int(failed), call_id),
+            )
+        return price if cursor.rowcount else None
+
+    # Aggregate rows per group (see GROUPS), most expensive first
+    def summary(self, group_by="document", since=None, limit=50):
+        key = GROUPS[group_by]
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {key} AS k, COUNT(*), SUM(failed), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost),"
+                " SUM(latency), SUM(prompt_chars) FROM usage WHERE created_at >= ?"
+                " GROUP BY k ORDER BY SUM(cost) DESC, k LIMIT ?",
+                (since or 0, limit),
+            ).fetchall()
+        result = []
+        for k, calls, failed, prompt_tokens, completion_tokens, spend, latency, prompt_chars in rows:
+            result.append({
+                group_by: k, "calls": calls, "failed": failed, "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens, "cost": round(spend, 6),
+                "mean_latency": latency / calls, "mean_prompt_chars": prompt_chars / calls,
+                "completion_tokens_per_s": completion_tokens / latency if latency else 0.0,
+                "completion_tokens_per_dollar": completion_tokens / spend if spend else None,
+            })
+        return result
+
+    # Totals over the whole ledger (or since a time)
+    def totals(self, since=None):
+        with self.lock:
+            calls, prompt_tokens, completion_tokens, spend = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0),"
+                " COALESCE(SUM(cost), 0) FROM usage WHERE created_at >= ?",
+                (since or 0,),
+            ).fetchone()
+        return {"calls": calls, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": spend}
+
+
+_default_ledger = None
+_default_lock = threading.Lock()
+
+
+# Function to get the process-wide ledger at LEDGER_PATH
+def default_ledger():
+    global _default_ledger
+    with _default_lock:
+        if _default_ledger is None:
+            _default_ledger = Ledger()
+        return _default_ledger
@@ -1,75 +1,413 @@
-import streamlit as st
-import PyPDF2
-import openai
-import os
-from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from PIL import Image
-import pytesseract
-import pdf2image
-import requests
-import json
-
-# Load environment variables
-load_dotenv()
-
-# API keys and environment variables
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-TIKTOKEN_API_KEY = os.getenv('TIKTOKEN_API_KEY')
-
-# Setup OpenAI API
-openai.api_key = OPENAI_API_KEY
-
-# Streamlit app title and configuration
-st.set_page_config(page_title="AI Exam Agent", page_icon=":books:", layout="wide")
-st.title("AI Exam Agent for Pharma Exam Preparation")
-
-# Function to process PDF and extract text
-def process_pdf(file):
-    pdf_reader = PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
-
-# Function to generate MCQs using OpenAI API
-def generate_mcqs(text):
-    response = openai.Completion.create(
-        model="text-davinci-003",
-        prompt=f"Create multiple choice questions from the following text:\n\n{text}",
-        max_tokens=1000
-    )
-    return response.choices[0].text.strip()
-
-# Function to extract text from an image using pytesseract
-def extract_text_from_image(image):
-    return pytesseract.image_to_string(image)
-
-# File upload widget
-pdf_file = st.file_uploader("Upload your PDF file", type=["pdf"])
-
-# When the user uploads a file
-if pdf_file:
-    st.success("File uploaded successfully!")
-    # Extract text from the PDF
-    text = process_pdf(pdf_file)
-    st.write("Extracted Text from PDF:")
-    st.text_area("Text", text, height=300)
-
-    # Generate MCQs
-    if st.button("Generate MCQs"):
-        mcqs = generate_mcqs(text)
-        st.subheader("Generated MCQs:")
-        st.write(mcqs)
-
-    # Optional: Add support for images (to extract text from images in the PDF)
-    image_file = st.file_uploader("Upload Image for Text Extraction", type=["png", "jpg", "jpeg"])
-
-    if image_file:
-        image = Image.open(image_file)
-        extracted_text = extract_text_from_image(image)
-        st.write("Extracted Text from Image:")
-        st.text_area("Image Text", extracted_text, height=300)
-
-# For custom features like API integration or other specific functions, add further logic
+import os
+import streamlit as st
+from PIL import Image
+from pipeline import extract_pages, strip_headers, join_pages, page_at, document_hash, clean_text, extract_text_from_image
+from pipeline import count_pages, parse_page_ranges, TABLE_MCQ_PROMPT
+import segment
+import tables
+import figures
+import key_sentences
+import ledger
+import bm25
+import vector_index
+import question_bank
+import drug_index
+import scheduler
+import exam
+import grading
+import job_queue
+import spool
+import profiling
+import metrics
+from profiling import span
+
+# Streamlit app title and configuration
+st.set_page_config(page_title="AI Exam Agent", page_icon=":books:", layout="wide")
+st.title("AI Exam Agent for Pharma Exam Preparation")
+
+# Expose Prometheus metrics on the side port (once per process)
+metrics.start_server()
+
+# Optional developer sidebar with per-stage timings
+show_dev_panel = st.sidebar.checkbox("Developer panel")
+profile_request = show_dev_panel and st.sidebar.checkbox("Profile this request (cProfile)")
+
+# Long jobs can run in background workers (worker.py) and survive the session; any session can reattach by job id
+jobs = job_queue.default_queue()
+background = st.sidebar.checkbox("Process in background workers")
+backends = {
+    "PyMuPDF (recovers Greek letters and symbols)": "pymupdf",
+    "PyPDF2": "pypdf2",
+    "OCR (scanned books)": "ocr",
+}
+backend = backends[st.sidebar.selectbox("Text extraction", list(backends))]
+ledger_user = st.sidebar.text_input("Your name (for API usage accounting)").strip() or None
+reattach_id = st.sidebar.text_input("Reattach to job", st.experimental_get_query_params().get("job", [""])[0]).strip()
+
+
+# Function to show a queued job's progress; returns the job once it has finished successfully
+def finished_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        st.error(f"No job {job_id}")
+    elif job["status"] == "done":
+        return job
+    elif job["status"] == "failed":
+        st.error(f"Job {job_id} failed: {job['error']}")
+    else:
+        st.progress(job["progress"])
+        st.caption(f"Job {job_id} {job['status']}" + (f": {job['message']}" if job["message"] else ""))
+        st.button("Refresh", key=f"refresh-{job_id}")
+    return None
+
+
+# Function to render generated or banked MCQs
+def show_questions(questions, from_bank):
+    with span("render"):
+        st.subheader("Generated MCQs:")
+        if from_bank:
+            st.caption("Served from the question bank")
+        st.markdown("\n\n".join(question_bank.format_question(q, i) for i, q in enumerate(questions, 1)))
+
+
+with profiling.profile(enabled=profile_request) as profile_result:
+    # File upload widget
+    pdf_file = st.file_uploader("Upload your PDF file", type=["pdf"])
+
+    # Extract text from the PDF and strip extraction artifacts before generation, here or in a worker
+    text = None
+    # The document is keyed by its file, so every page or chapter selection (and every backend) shares its questions
+    doc_hash = None
+    source_pdf = None
+    figure_index = None
+    reattached = finished_job(reattach_id) if reattach_id and not pdf_file else None
+    if pdf_file:
+        # Spool the upload to disk once; extraction reads the spool file through mmap
+        pdf_path = st.session_state.get(f"upload-{pdf_file.id}")
+        if pdf_path is None or not os.path.exists(pdf_path):
+            spool.purge()
+            pdf_path = st.session_state[f"upload-{pdf_file.id}"] = spool.spool_upload(pdf_file, ".pdf")
+        with spool.mapped(pdf_path) as view:
+            outline = segment.read_outline(view)
+            page_count = count_pages(view)
+
+        # Optionally extract only some chapters (from the PDF outline) or a page range
+        outline_chapters = segment.outline_chapters(outline, page_count)
+        picked = st.multiselect(
+            "Extract only these chapters", outline_chapters,
+            format_func=lambda c: f"{c.title} (pages {c.start_page + 1}-{c.end_page})",
+        ) if outline_chapters else []
+        page_spec = st.text_input(f"Extract only these pages (of {page_count}), e.g. 120-180, 200")
+        try:
+            page_numbers = sorted(set(segment.chapter_pages(picked)) | set(parse_page_ranges(page_spec, page_count)))
+        except ValueError as error:
+            st.error(str(error))
+            st.stop()
+        page_numbers = page_numbers or None
+    if pdf_file and background:
+        job_key = f"extract-job-{pdf_file.id}-{backend}-{page_spec}-{[c.start_page for c in picked]}"
+        if job_key not in st.session_state:
+            path = jobs.spool(pdf_file, ".pdf")
+            st.session_state[job_key] = jobs.enqueue(
+                "extract", {"path": path, "backend": backend, "pages": page_numbers}, job_queue.PRIORITY_INTERACTIVE,
+            )
+            st.experimental_set_query_params(job=st.session_state[job_key])
+        extracted = finished_job(st.session_state[job_key])
+        if extracted:
+            text, page_starts, outline = (extracted["result"][key] for key in ("text", "page_starts", "outline"))
+            doc_hash = extracted["result"].get("doc_hash")
+            source_pdf = extracted["payload"]["path"]
+            figure_index = extracted["result"].get("figures")
+    elif pdf_file:
+        # Every widget click reruns the script: extract (or OCR) once per upload, backend and selection.
+        # Only the latest extraction is kept, so a session holds one document's text.
+        extract_key = f"{pdf_file.id}-{backend}-{page_numbers}"
+        cached = st.session_state.get("inline-extract")
+        if cached is None or cached[0] != extract_key:
+            pages = extract_pages(pdf_path, backend=backend, page_numbers=page_numbers)
+            cached = st.session_state["inline-extract"] = (
+                extract_key, join_pages([clean_text(page) for page in strip_headers(pages)]),
+            )
+        text, page_starts = cached[1]
+        doc_hash = tables.file_digest(pdf_path)
+        source_pdf = pdf_path
+    elif reattached and reattached["kind"] == "extract":
+        text, page_starts, outline = (reattached["result"][key] for key in ("text", "page_starts", "outline"))
+        doc_hash = reattached["result"].get("doc_hash")
+        source_pdf = reattached["payload"]["path"]
+        figure_index = reattached["result"].get("figures")
+    elif reattached and reattached["kind"] == "mcqs":
+        show_questions(reattached["result"]["questions"], reattached["result"]["from_bank"])
+    elif reattached and reattached["kind"] == "ocr":
+        st.text_area("Image Text", reattached["result"]["text"], height=300)
+
+    # When the document's text is available
+    if text is not None:
+        st.success("File processed successfully!")
+        with span("segment"):
+            index = segment.build_index(text, outline, page_starts)
+        if figure_index is None:
+            with span("figures"):
+                figure_index = figures.build_figure_index(text, page_starts)
+        with span("render"):
+            st.write("Extracted Text from PDF:")
+            st.text_area("Text", text, height=300)
+
+        # Optionally restrict generation to a single chapter (of those that were extracted)
+        chapters = [c for c in segment.chapters(index) if segment.segment_text(text, c).strip()]
+        chapter = st.selectbox(
+            "Generate questions for",
+            [None] + chapters,
+            format_func=lambda c: "Whole document" if c is None else f"Chapter {c.number}: {c.title}",
+        )
+        source_text = text if chapter is None else segment.segment_text(text, chapter)
+        source_offset = 0 if chapter is None else chapter.start
+
+        # Optionally focus on one drug mentioned in the selection
+        with span("drug_index"):
+            entities = drug_index.build_entity_index(text, page_starts)
+        if chapter is not None:
+            entities = {
+                drug: [hit for hit in hits if chapter.start <= hit[1] < chapter.end] for drug, hits in entities.items()
+            }
+            entities = {drug: hits for drug, hits in entities.items() if hits}
+        drug = st.selectbox(
+            "Focus on drug",
+            [None] + sorted(entities),
+            format_func=lambda d: "Any drug" if d is None else f"{d} ({len(entities[d])} mentions)",
+        )
+        if drug:
+            source_text = drug_index.drug_context(text, entities, drug)
+            source_offset = entities[drug][0][1]
+
+        # Optionally narrow further to the passages that best match a topic
+        topic = st.text_input("Topic (optional), e.g. atropine toxicity")
+        retrieval = st.radio("Match topic by", ["Keywords (BM25)", "Meaning (vectors)"], horizontal=True)
+        if topic:
+            with span("retrieve"):
+                store = bm25 if retrieval.startswith("Keywords") else vector_index
+                passages = store.index_for_text(source_text).retrieve(topic, k=5)
+            if passages:
+                source_text = "\n\n".join(passages)
+                source_offset = max(text.find(passages[0]), 0)
+            else:
+                # An empty prompt would still be paid for, and its invented questions banked under this document
+                st.warning("No passage matches this topic; questions will come from the selection above.")
+
+        # Optionally shrink the prompt to the selection's key sentences
+        reduction = st.select_slider(
+            "Prompt size", [1, 2, 3, 4, 5, 8], value=1,
+            format_func=lambda f: "Full text" if f == 1 else f"Key sentences, about 1/{f} of the tokens",
+        )
+        if reduction > 1:
+            full_tokens = key_sentences.estimate_tokens(source_text)
+            source_text = key_sentences.select_key_sentences(source_text, factor=reduction)
+            st.caption(f"Prompt cut from ~{full_tokens} to ~{key_sentences.estimate_tokens(source_text)} tokens")
+
+        # Generate MCQs, serving questions already in the bank before calling the LLM
+        bank = question_bank.default_bank()
+        # Results of extract jobs queued before documents were keyed by file carry no file digest
+        doc_hash = doc_hash or document_hash(text)
+        source_chapter = None if chapter is None else chapter.number
+        source_page = page_at(page_starts, source_offset) + 1
+        if st.button("Generate MCQs"):
+            if background:
+                st.session_state["mcq-job"] = jobs.enqueue(
+                    "mcqs",
+                    {"text": source_text, "doc_hash": doc_hash, "chapter": source_chapter, "page": source_page,
+                     "user": ledger_user},
+                    job_queue.PRIORITY_INTERACTIVE,
+                )
+            else:
+                show_questions(*question_bank.get_or_generate(
+                    bank, source_text, doc_hash, chapter=source_chapter, page=source_page, user=ledger_user,
+                ))
+        if background and "mcq-job" in st.session_state:
+            generated = finished_job(st.session_state["mcq-job"])
+            if generated:
+                show_questions(generated["result"]["questions"], generated["result"]["from_bank"])
+
+        # Tables on the selected pages, as structured rows; comparison MCQs from one table cost far fewer tokens
+        with st.expander("Tables"):
+            if source_pdf and os.path.exists(source_pdf) and st.checkbox("Find tables in this selection"):
+                if chapter is None:
+                    # Only the pages that were extracted (and are not blank)
+                    bounds = page_starts + [len(text) + 1]
+                    table_pages = [i for i in range(len(page_starts)) if bounds[i + 1] - bounds[i] > 1]
+                else:
+                    table_pages = range(page_at(page_starts, chapter.start), page_at(page_starts, max(chapter.end - 1, 0)) + 1)
+                with span("tables"):
+                    found = tables.tables_for_pages(source_pdf, table_pages)
+                if not found:
+                    st.write("No tables found.")
+                for i, table in enumerate(found):
+                    st.caption(f"Page {table.page + 1}" + (f": {table.caption}" if table.caption else ""))
+                    st.table([table.header] + table.rows)
+                    if st.button("Generate comparison MCQs from this table", key=f"table-mcqs-{table.page}-{i}"):
+                        show_questions(*question_bank.get_or_generate(
+                            bank, tables.to_text(table), doc_hash, chapter=source_chapter, page=table.page + 1,
+                            prompt=TABLE_MCQ_PROMPT, user=ledger_user,
+                        ))
+
+        # Figures and tables by number: caption, page, the passages that cite them and the figure itself
+        with st.expander(f"Figures and tables ({len(figure_index)})"):
+            if figure_index:
+                key = st.selectbox(
+                    "Figure or table", sorted(figure_index, key=lambda k: (figure_index[k]["page"] or 0, k)),
+                    format_func=lambda k: f"{k}: {figure_index[k]['caption'] or '(caption not found)'}",
+                )
+                figure = figure_index[key]
+                st.caption(
+                    (f"Page {figure['page']}, " if figure["page"] else "") + f"cited {len(figure['references'])} times"
+                )
+                if figure["page"] and source_pdf and os.path.exists(source_pdf):
+                    with span("figures"):
+                        st.image(figures.render_region(source_pdf, figure))
+                for passage in figures.reference_context(text, figure):
+                    st.text(passage)
+
+        # Drug coverage: how often each drug is mentioned and how many banked questions ask about it
+        with st.expander(f"Drug coverage ({len(entities)} drugs)"):
+            st.table(drug_index.coverage(entities, bank.for_document(doc_hash)))
+
+        # Drill banked questions with spaced repetition
+        with st.expander("Study with spaced repetition"):
+            student = st.text_input("Student name")
+            if student:
+                reviews = scheduler.default_scheduler()
+                if st.button("Add this document's questions to my deck"):
+                    added = reviews.add_cards(student, [q["id"] for q in bank.for_document(doc_hash)])
+                    st.write(f"Added {added} new cards.")
+                st.caption(f"{reviews.due_count(student)} cards due")
+                due = reviews.next_due(student, 1)
+                if due:
+                    card = bank.get(due)[0]
+                    st.markdown(question_bank.format_question(dict(card, answer=None)))
+                    if st.checkbox("Show answer", key=f"reveal-{card['id']}"):
+                        st.markdown(f"*Answer: {card['answer'] or 'not recorded'}*")
+                        columns = st.columns(4)
+                        for column, (label, quality) in zip(columns, [("Again", 1), ("Hard", 3), ("Good", 4), ("Easy", 5)]):
+                            if column.button(label, key=f"grade-{card['id']}-{quality}"):
+                                reviews.review(student, card["id"], quality)
+                                st.experimental_rerun()
+
+        # Search every question generated so far
+        with st.expander(f"Search the question bank ({bank.count()} questions)"):
+            query = st.text_input("Search question stems")
+            if query:
+                for q in bank.search(query):
+                    st.markdown(question_bank.format_question(q))
+
+        # Optional: Add support for images (to extract text from images in the PDF)
+        image_file = st.file_uploader("Upload Image for Text Extraction", type=["png", "jpg", "jpeg"])
+
+        if image_file and background:
+            job_key = f"ocr-job-{image_file.id}"
+            if job_key not in st.session_state:
+                path = jobs.spool(image_file, "." + image_file.name.rsplit(".", 1)[-1])
+                st.session_state[job_key] = jobs.enqueue("ocr", {"path": path}, job_queue.PRIORITY_INTERACTIVE)
+            recognized = finished_job(st.session_state[job_key])
+            if recognized:
+                st.write("Extracted Text from Image:")
+                st.text_area("Image Text", recognized["result"]["text"], height=300)
+        elif image_file:
+            image = Image.open(image_file)
+            extracted_text = extract_text_from_image(image)
+            with span("render"):
+                st.write("Extracted Text from Image:")
+                st.text_area("Image Text", extracted_text, height=300)
+
+    # Timed mock exams: papers are assembled once from the bank and shared by every session
+    with st.expander("Mock exam"):
+        exams = exam.default_store()
+        if text is not None:
+            paper_title = st.text_input("Paper title", "Pharmacology mock exam")
+            paper_size = st.number_input("Questions", min_value=5, max_value=200, value=50)
+            paper_minutes = st.number_input("Minutes", min_value=5, max_value=300, value=60)
+            if st.button("Assemble paper from this document"):
+                try:
+                    exams.create_paper(paper_title, int(paper_size), paper_minutes, doc_hash)
+                except ValueError as error:
+                    st.error(str(error))
+        papers = dict(exams.list_papers())
+        if papers:
+            paper_id = st.selectbox("Paper", list(papers), format_func=lambda i: f"#{i} {papers[i]}")
+            session_key = f"exam-session-{paper_id}"
+            if session_key not in st.session_state:
+                exam_student = st.text_input("Your name", key="exam-student")
+                if exam_student and st.button("Start exam"):
+                    st.session_state[session_key] = exams.start(paper_id, exam_student)
+                    st.experimental_rerun()
+            else:
+                session_id = st.session_state[session_key]
+                paper = exams.paper(paper_id)
+                left = exams.remaining(session_id)
+                st.caption(f"{int(left // 60)} min {int(left % 60)} s left" if left else "Exam closed")
+                saved = exams.session(session_id)["answers"]
+                answers = {}
+                for i, q in enumerate(paper["questions"]):
+                    letters = ["-"] + list("abcde"[:len(q["options"])])
+                    choice = st.radio(
+                        f"{i + 1}. {q['stem']}", letters, key=f"{session_id}-{i}",
+                        index=letters.index(saved.get(str(i), "-")),
+                        format_func=lambda letter, q=q: "No answer" if letter == "-" else f"{letter}) {q['options']['abcde'.index(letter)]}",
+                    )
+                    answers[i] = None if choice == "-" else choice
+                # Every rerun (each answer clicked) is saved, so a closed tab or a missed deadline loses nothing
+                if left:
+                    exams.save_answers(session_id, answers)
+                if left and st.button("Submit exam"):
+                    on_time = exams.save_answers(session_id, answers, submit=True)
+                    st.write("Submitted." if on_time else "Time was up; answers saved before the deadline were kept.")
+            # Grading and item analysis show the answer key: examiners only, and only once nobody is sitting the paper
+            examiner_password = st.text_input("Examiner password", type="password", key="examiner-password")
+            if exam.is_examiner(examiner_password):
+                if st.button("Grade all finished sessions of this paper"):
+                    scores = exams.grade_paper(paper_id)
+                    st.write(f"Graded {len(scores)} sessions.")
+                    still_open = exams.open_sessions(paper_id)
+                    if still_open:
+                        st.caption(f"Item analysis is shown once the {still_open} open sessions have finished.")
+                    elif scores:
+                        analysis = exams.analyze_paper(paper_id)
+                        st.subheader("Item analysis")
+                        st.table(grading.item_rows(analysis, exams.paper(paper_id)["key"]))
+                        exams.apply_difficulty(paper_id, analysis)
+            elif examiner_password:
+                st.error("Wrong examiner password")
+
+    # API spend from the usage ledger: what each document, user and provider costs, and throughput per prompt size
+    with st.expander("API usage and cost"):
+        book = ledger.default_ledger()
+        totals = book.totals()
+        columns = st.columns(3)
+        columns[0].metric("Requests", totals["calls"])
+        columns[1].metric("Tokens", totals["prompt_tokens"] + totals["completion_tokens"])
+        columns[2].metric("Cost (USD)", f"{totals['cost']:.2f}")
+        usage_group = st.radio("Group by", list(ledger.GROUPS), horizontal=True)
+        usage_rows = book.summary(usage_group)
+        if usage_group == "document":
+            # Documents are keyed by text hash; the prefix is enough to tell them apart
+            usage_rows = [dict(row, document=(row["document"] or "-")[:12]) for row in usage_rows]
+            if text is not None:
+                st.caption(f"This document is {doc_hash[:12]}")
+        if usage_rows:
+            st.table(usage_rows)
+        else:
+            st.write("No API calls recorded yet.")
+
+# Developer panel: timing histograms for every stage, plus the cProfile report when requested
+if show_dev_panel:
+    st.sidebar.subheader("Stage timings")
+    rows = profiling.summary()
+    if rows:
+        st.sidebar.table(rows)
+    else:
+        st.sidebar.write("No stages recorded yet.")
+    if st.sidebar.button("Reset timings"):
+        profiling.reset()
+    if "report" in profile_result:
+        st.sidebar.subheader("cProfile (top 25 by cumulative time)")
+        st.sidebar.text(profile_result["report"])
+
+# For custom features like API integration or other specific functions, add further logic
@@ -0,0 +1,218 @@
+# Prometheus-style metrics for the exam agent.
+#
+# Metrics are plain in-process objects rendered in the Prometheus text exposition
+# format by a small HTTP server on a side port (METRICS_PORT, default 9108; set it
+# to 0 to disable). Each replica serves its own numbers; the scraper aggregates.
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import profiling
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+_lock = threading.Lock()
+_registry = []
+_collectors = []
+_server = None
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Base class for a metric family with optional labels
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        if not self.labelnames and self.kind != "histogram":
+            self._values[()] = 0
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+# Monotonically increasing counter
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+# Value that can go up and down
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+# Cumulative bucket histogram with _bucket, _sum and _count series
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=profiling.BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# Metrics exported by the exam agent
+STAGE_SECONDS = Histogram("exam_agent_stage_seconds", "Wall time of pipeline stages.", ["stage"])
+STAGE_ERRORS = Counter("exam_agent_stage_errors_total", "Pipeline stage calls that raised.", ["stage"])
+PAGES_EXTRACTED = Counter("exam_agent_pages_extracted_total", "PDF pages run through text extraction.")
+HEADER_LINES_STRIPPED = Counter("exam_agent_header_lines_stripped_total", "Running-head and page-number lines stripped from pages.")
+OCR_CALLS = Counter("exam_agent_ocr_calls_total", "Images sent to OCR.")
+LLM_REQUESTS = Counter("exam_agent_llm_requests_total", "Completion requests sent to the LLM.", ["model"])
+LLM_SECONDS = Histogram("exam_agent_llm_seconds", "Latency of completion requests.", ["model"])
+LLM_TOKENS = Counter("exam_agent_llm_tokens_total", "Tokens used by completion requests.", ["model", "kind"])
+LLM_COST = Counter("exam_agent_llm_cost_dollars_total", "Estimated spend on completion requests in USD (see ledger.py).", ["model"])
+CACHE_REQUESTS = Counter("exam_agent_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+QUESTIONS_DEDUPLICATED = Counter("exam_agent_questions_deduplicated_total", "Generated questions dropped as near-duplicates.")
+QUEUE_DEPTH = Gauge("exam_agent_queue_depth", "Work items waiting or in progress.", ["queue"])
+
+
+# Function to record a cache lookup; the hit ratio is hits / (hits + misses) at query time
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# Function to record token usage from an OpenAI-shaped response
+def record_usage(model, response):
+    usage = response.get("usage") or {}
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], model=model, kind=kind.split("_")[0])
+
+
+def _on_span(name, seconds, failed):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if failed:
+        STAGE_ERRORS.inc(stage=name)
+
+
+profiling.add_listener(_on_span)
+
+
+# Function to register a callable that refreshes gauges right before each scrape
+def add_collector(collect):
+    with _lock:
+        _collectors.append(collect)
+
+
+# Function to render every registered metric in Prometheus text format
+def render():
+    with _lock:
+        collectors = list(_collectors)
+    for collect in collectors:
+        try:
+            collect()
+        except Exception:
+            # A failing collector leaves its gauges at their last value rather than failing the scrape
+            pass
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Function to start the metrics server once per process (safe to call on every Streamlit rerun)
+def start_server(port=METRICS_PORT, host="0.0.0.0"):
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            # Another process on this host already owns the port
+            return None
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
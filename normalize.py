@@ -0,0 +1,58 @@
+# Text normalization for PDF extraction artifacts.
+#
+# PyPDF2 output for the textbook corpus carries a few systematic artifacts:
+#   - chapter banners rendered as stacked copies, e.g. "GangliaChapterChapterChapterChapterChapter 88888"
+#     (heading word and number each repeated, sometimes followed by the page number)
+#   - words split by line-end hyphens, e.g. "demon-\nstrated"
+#   - hard line wraps in the middle of sentences
+#   - runs of spaces and blank lines
+# Figure and table caption lines ("Fig. 29.1: A normal sleep cycle", "TABLE 45.2 Types of ...")
+# are kept on a line of their own: they usually end in a lowercase word, and joining
+# them to the body text that follows would run that text into the caption.
+# All of them are handled by one compiled alternation, so the text is scanned once. The
+# leading lookahead lets the regex engine skip ordinary characters without trying
+# each alternative at every position.
+import re
+
+_PATTERN = re.compile(
+    r"(?=[ \t\f\v\n\-CSFT])(?:"
+    r"(?P<header>[ \t]*(?P<word>Chapter|CHAPTER|Section|SECTION)(?:(?P=word))+[ \t]*(?P<digits>\d+)[ \t]*\n?)"
+    r"|(?P<caption>(?<![^\n])[ \t]*(?:Fig(?:ure)?\.?[ \t]*\d+\.\d+[ \t]*:|TABLE[ \t]+\d+\.\d+[ \t]+[A-Z])[^\n]*?"
+    r"(?:[ \t]*\n(?![ \t\f\v]*\n)|(?=[ \t\f\v]*(?:\n|$))))"
+    r"|(?P<hyphen>(?<=[a-z])-[ \t]*\n[ \t]*(?=[a-z]))"
+    r"|(?P<wrap>(?<=[a-z,;])[ \t]*\n[ \t]*(?=[a-z]|\((?![a-hivx]{1,4}\))))"
+    r"|(?P<trail>[ \t\f\v]+(?=\n)|(?<=\n)[ \t\f\v]+)"
+    r"|(?P<space>[ \t\f\v]{2,})"
+    r"|(?P<blank>\n(?:[ \t\f\v]*\n)+))"
+)
+
+
+# Function to recover the chapter number from a repeated banner number ("1010101010144" x5 -> "10")
+def _banner_number(digits, copies):
+    for size in range(len(digits) // copies, 0, -1):
+        number = digits[:size]
+        if digits.startswith(number * copies):
+            return number
+    return digits
+
+
+# Fixed replacement for every artifact except chapter banners
+_REPLACEMENTS = {"hyphen": "", "trail": "", "wrap": " ", "space": " ", "blank": "\n\n"}
+
+
+def _replace(match):
+    replacement = _REPLACEMENTS.get(match.lastgroup)
+    if replacement is not None:
+        return replacement
+    if match.lastgroup == "caption":
+        # The caption line with its spacing normalized, and its line end kept
+        line = match.group(0)
+        return " ".join(line.split()) + ("\n" if line.endswith("\n") else "")
+    word = match.group("word")
+    copies = match.group(0).count(word)
+    return f"\n{word.capitalize()} {_banner_number(match.group('digits'), copies)}\n"
+
+
+# Function to normalize extracted text in a single pass: headers, hyphenation, line wraps, whitespace
+def normalize_text(text):
+    return _PATTERN.sub(_replace, text).strip()
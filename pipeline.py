@@ -0,0 +1,257 @@
+import bisect
+import hashlib
+import os
+import re
+import time
+import fitz
+import openai
+from dotenv import load_dotenv
+from PyPDF2 import PdfReader
+import pytesseract
+from PIL import Image
+from profiling import span, timed
+from normalize import normalize_text
+from running_heads import strip_running_heads
+import glyphs
+import spool
+import metrics
+import ledger
+import replay
+
+# Load environment variables
+load_dotenv()
+
+# API keys and environment variables
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+TIKTOKEN_API_KEY = os.getenv('TIKTOKEN_API_KEY')
+
+# Setup OpenAI API
+openai.api_key = OPENAI_API_KEY
+
+# Model and chunking settings
+MCQ_MODEL = "text-davinci-003"
+# Provider recorded in the usage ledger; a completion function can name its own with a .provider attribute
+MCQ_PROVIDER = "openai"
+MCQ_MAX_TOKENS = 1000
+CHUNK_CHARS = 8000
+# PDF text backend: "pymupdf" (recovers Greek letters and symbols, see glyphs.py, and reads spooled files page by
+# page so memory stays bounded), "pypdf2", or "ocr" for scans. Documents are keyed by their file, so a book keeps
+# its questions, papers and spend whatever the backend. The question bank serves a text slice by the hash of its
+# text, though, and the backends differ on symbol fonts: a bank filled under the old PyPDF2 default misses such
+# slices after the switch. Deployments with a paid-for bank set PDF_BACKEND=pypdf2 to keep serving it.
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pymupdf")
+PDF_BACKENDS = ("pymupdf", "pypdf2", "ocr")
+OCR_DPI = 200
+# When set, every completion request/response pair is journaled here for offline replay (see replay.py)
+LLM_JOURNAL_PATH = os.getenv("LLM_JOURNAL_PATH")
+MCQ_PROMPT = (
+    "Create multiple choice questions from the following text. "
+    "After each question's options add a line \"Answer: <letter>\" and a line "
+    "\"Difficulty: easy|medium|hard\".\n\n{text}"
+)
+# Tables arrive as "a | b | c" rows (see tables.to_text), first row the header
+TABLE_MCQ_PROMPT = (
+    "Create multiple choice questions that compare the rows of the following table, "
+    "e.g. which drug has a given property. Its first row is the header. "
+    "After each question's options add a line \"Answer: <letter>\" and a line "
+    "\"Difficulty: easy|medium|hard\".\n\n{text}"
+)
+
+_QUESTION_START = re.compile(r"^\s*(?:Q(?:uestion)?\s*)?\d+\s*[.):]\s*(.*)$", re.IGNORECASE)
+_OPTION = re.compile(r"^\s*\(?([A-Ea-e])[.)]\s*(.+)$")
+_DIFFICULTY = re.compile(r"^\s*difficulty\s*[:\-]\s*(easy|medium|hard)\b", re.IGNORECASE)
+_ANSWER = re.compile(r"^\s*(?:correct\s+)?answer\s*[:\-]?\s*\(?([A-Ea-e])\b", re.IGNORECASE)
+
+# Function to extract the text of each PDF page (file object or spooled path), optionally reporting progress(done, total).
+# With page_numbers (0-based), only those pages are read; the rest come back as "" so page indexes stay aligned.
+@timed("extract_pages")
+def extract_pages(file, progress=None, backend=None, page_numbers=None):
+    backend = backend or PDF_BACKEND
+    if backend == "pymupdf":
+        return glyphs.extract_pages(file, progress, page_numbers)
+    if backend == "ocr":
+        return ocr_pages(file, progress, page_numbers)
+    if backend != "pypdf2":
+        raise ValueError(f"unknown PDF backend {backend!r}; expected one of {', '.join(PDF_BACKENDS)}")
+    if isinstance(file, str):
+        # Spooled upload: PyPDF2 reads it through a read-only mmap (see spool.py). Its parsed objects still grow
+        # with the file, about the file's size per upload; only the pymupdf backend keeps a spooled upload bounded.
+        with spool.mapped(file) as view:
+            return _pypdf2_pages(view, progress, page_numbers)
+    return _pypdf2_pages(file, progress, page_numbers)
+
+def _pypdf2_pages(file, progress, page_numbers):
+    pdf_reader = PdfReader(file)
+    total = len(pdf_reader.pages)
+    wanted = range(total) if page_numbers is None else [i for i in page_numbers if 0 <= i < total]
+    pages = [""] * total
+    for done, i in enumerate(wanted, 1):
+        # Only the selected pages' content streams are read and parsed
+        pages[i] = pdf_reader.pages[i].extract_text()
+        metrics.PAGES_EXTRACTED.inc()
+        if progress:
+            progress(done, len(wanted))
+    return pages
+
+# Function to OCR each page of a scanned PDF, rasterizing one page at a time so memory stays at one page image
+def ocr_pages(file, progress=None, page_numbers=None, dpi=OCR_DPI):
+    with glyphs.open_document(file) as doc:
+        wanted = range(doc.page_count) if page_numbers is None else [i for i in page_numbers if 0 <= i < doc.page_count]
+        pages = [""] * doc.page_count
+        for done, i in enumerate(wanted, 1):
+            pixmap = doc.load_page(i).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            pages[i] = extract_text_from_image(Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples))
+            metrics.PAGES_EXTRACTED.inc()
+            if progress:
+                progress(done, len(wanted))
+    return pages
+
+# Function to count the pages of a PDF file object without extracting any text
+def count_pages(file):
+    file.seek(0)
+    return len(PdfReader(file).pages)
+
+# Function to parse a page selection like "120-180, 200" (1-based, inclusive) into sorted 0-based page indexes.
+# Malformed, reversed or out-of-range parts raise ValueError rather than silently selecting fewer pages.
+def parse_page_ranges(spec, page_count):
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        if not first.strip().isdigit() or (last and not last.strip().isdigit()):
+            raise ValueError(f"bad page range {part!r}")
+        first = int(first)
+        last = int(last) if last else first
+        if first > last:
+            raise ValueError(f"page range {part!r} is reversed")
+        if first < 1 or last > page_count:
+            raise ValueError(f"page range {part!r} is outside pages 1-{page_count}")
+        selected.update(range(first - 1, last))
+    return sorted(selected)
+
+# Function to process PDF and extract text
+@timed("process_pdf")
+def process_pdf(file, backend=None, page_numbers=None):
+    return "".join(strip_headers(extract_pages(file, backend=backend, page_numbers=page_numbers)))
+
+# Function to join page texts into one text, keeping the offset where each page starts
+def join_pages(pages):
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page) + 1
+    return "\n".join(pages), page_starts
+
+# Function to fingerprint a document's text, used as its key in on-disk stores
+def document_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# Function to find the page index containing a text offset
+def page_at(page_starts, offset):
+    return max(bisect.bisect_right(page_starts, offset) - 1, 0)
+
+# Function to strip running heads and page numbers learned across a document's pages (see running_heads.py)
+@timed("strip_headers")
+def strip_headers(pages):
+    stripped = strip_running_heads(pages)
+    metrics.HEADER_LINES_STRIPPED.inc(sum(page.count("\n") for page in pages) - sum(page.count("\n") for page in stripped))
+    return stripped
+
+# Function to clean extracted text before it is chunked (see normalize.py)
+@timed("clean_text")
+def clean_text(text):
+    return normalize_text(text)
+
+# Function to split text into chunks of at most max_chars, breaking on line ends
+@timed("chunk_text")
+def chunk_text(text, max_chars=CHUNK_CHARS):
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+# Function to send a prompt to the OpenAI completion endpoint
+def openai_complete(prompt, max_tokens=MCQ_MAX_TOKENS):
+    return openai.Completion.create(**completion_body(prompt, max_tokens))
+
+# Function to build the completion request body openai_complete sends (batch request files hold the same bodies)
+def completion_body(prompt, max_tokens=MCQ_MAX_TOKENS):
+    return {"model": MCQ_MODEL, "prompt": prompt, "max_tokens": max_tokens}
+
+# Function to get the generated text out of an OpenAI-shaped completion response
+def completion_text(response):
+    return response["choices"][0]["text"].strip()
+
+# Function to generate MCQs using OpenAI API (or any completion function with the same shape).
+# Every request, failed or not, is appended to the usage ledger under user and doc_hash.
+@timed("generate_mcqs")
+def generate_mcqs(text, complete=openai_complete, prompt=MCQ_PROMPT, user=None, doc_hash=None):
+    request = prompt.format(text=text)
+    metrics.QUEUE_DEPTH.inc(queue="llm")
+    start = time.perf_counter()
+    response = None
+    try:
+        with span("llm_call"):
+            response = complete(request)
+    finally:
+        metrics.QUEUE_DEPTH.dec(queue="llm")
+        latency = time.perf_counter() - start
+        usage = (response or {}).get("usage") or {}
+        spend = ledger.default_ledger().record(
+            getattr(complete, "provider", MCQ_PROVIDER), MCQ_MODEL, usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0), latency, user=user, doc_hash=doc_hash, prompt_chars=len(request),
+            failed=response is None,
+        )
+        metrics.LLM_COST.inc(spend, model=MCQ_MODEL)
+    if LLM_JOURNAL_PATH and getattr(complete, "provider", None) != "replay":
+        replay.record(LLM_JOURNAL_PATH, request, response, latency)
+    metrics.LLM_REQUESTS.inc(model=MCQ_MODEL)
+    metrics.LLM_SECONDS.observe(latency, model=MCQ_MODEL)
+    metrics.record_usage(MCQ_MODEL, response)
+    return completion_text(response)
+
+# Function to split generated MCQ text into {"stem", "options", "answer", "difficulty"} dicts
+def parse_mcqs(text):
+    questions = []
+    current = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        question = _QUESTION_START.match(line)
+        option = _OPTION.match(line)
+        answer = _ANSWER.match(line)
+        difficulty = _DIFFICULTY.match(line)
+        if question:
+            current = {"stem": question.group(1).strip(), "options": [], "answer": None, "difficulty": None}
+            questions.append(current)
+        elif current is None:
+            continue
+        elif answer:
+            current["answer"] = answer.group(1).lower()
+        elif difficulty:
+            current["difficulty"] = difficulty.group(1).lower()
+        elif option:
+            current["options"].append(option.group(2).strip())
+        elif not current["options"]:
+            current["stem"] = (current["stem"] + " " + line.strip()).strip()
+    if not questions and text.strip():
+        # Unstructured output is still kept so it is not paid for twice
+        questions.append({"stem": text.strip(), "options": [], "answer": None, "difficulty": None})
+    return questions
+
+# Function to extract text from an image using pytesseract
+@timed("extract_text_from_image")
+def extract_text_from_image(image):
+    metrics.OCR_CALLS.inc()
+    return pytesseract.image_to_string(image)
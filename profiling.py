@@ -0,0 +1,130 @@
+# Lightweight timing spans for the exam agent pipeline.
+#
+# Every span observes its wall time into a per-stage histogram that lives for the
+# life of the process, so Streamlit reruns keep accumulating into the same numbers.
+import bisect
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_listeners = []
+
+
+# Class to aggregate span durations into fixed buckets
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    # Estimate a quantile from the bucket counts (upper bound of the bucket it falls in)
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+# Function to record a duration for a stage and notify listeners (e.g. metrics exporters)
+def observe(name, seconds, failed=False):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+    for listener in _listeners:
+        listener(name, seconds, failed)
+
+
+# Function to register a callback(name, seconds, failed) that sees every finished span
+def add_listener(listener):
+    _listeners.append(listener)
+
+
+# Context manager to time a block of code as a named span
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        observe(name, time.perf_counter() - start, failed)
+
+
+# Decorator to time every call of a function as a named span
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Function to summarise all histograms as rows for display
+def summary():
+    with _lock:
+        items = sorted(_histograms.items())
+        return [
+            {
+                "stage": name,
+                "calls": h.count,
+                "total_s": round(h.total, 4),
+                "mean_s": round(h.total / h.count, 4),
+                "p50_s": round(h.quantile(0.5), 4),
+                "p95_s": round(h.quantile(0.95), 4),
+                "max_s": round(h.max, 4),
+            }
+            for name, h in items
+        ]
+
+
+# Function to forget all recorded spans
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+# Context manager to run a block under cProfile; the yielded dict gets a "report" key
+@contextmanager
+def profile(enabled=True, limit=25, sort="cumulative"):
+    result = {}
+    if not enabled:
+        yield result
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+        result["report"] = out.getvalue()
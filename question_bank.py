@@ -0,0 +1,275 @@
+# Persistent question bank in SQLite.
+#
+# Every generated question is stored with the hash of its source document, the
+# hash of the exact text slice it was generated from, and its chapter and page.
+# Before calling the LLM the app asks the bank for questions generated from the
+# same slice, so reruns and repeat uploads are served from disk.
+#
+# The database runs in WAL mode so Streamlit sessions can read while another one
+# writes, and question stems are indexed with FTS5 for full-text search.
+#
+# Near-duplicates (overlapping chunks, the same book uploaded twice) are caught on
+# insert with MinHash/LSH (see dedup.py): band keys live in an indexed table, so a
+# lookup costs a few index probes however many questions the bank holds (banks
+# from before deduplication are signed when first opened). A duplicate is not
+# stored again; the source slice is linked to the existing question,
+# and so is the document (with the chapter and page it came from there), so a
+# second book that repeats a first one's questions still has them.
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import dedup
+import metrics
+from pipeline import MCQ_PROMPT, document_hash, generate_mcqs, openai_complete, parse_mcqs
+
+DB_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join("data", "question_bank.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    source_hash TEXT NOT NULL,
+    chapter TEXT,
+    page INTEGER,
+    stem TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT,
+    created_at REAL NOT NULL,
+    difficulty TEXT
+);
+CREATE INDEX IF NOT EXISTS questions_source ON questions (source_hash);
+CREATE INDEX IF NOT EXISTS questions_doc_chapter ON questions (doc_hash, chapter);
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5 (stem, content='questions', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS questions_ai AFTER INSERT ON questions BEGIN
+    INSERT INTO questions_fts (rowid, stem) VALUES (new.id, new.stem);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_ad AFTER DELETE ON questions BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, stem) VALUES ('delete', old.id, old.stem);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_au AFTER UPDATE OF stem ON questions BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, stem) VALUES ('delete', old.id, old.stem);
+    INSERT INTO questions_fts (rowid, stem) VALUES (new.id, new.stem);
+END;
+CREATE TABLE IF NOT EXISTS question_sources (
+    source_hash TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    PRIMARY KEY (source_hash, question_id)
+);
+CREATE TABLE IF NOT EXISTS question_documents (
+    doc_hash TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    chapter TEXT,
+    page INTEGER,
+    PRIMARY KEY (doc_hash, question_id)
+);
+CREATE INDEX IF NOT EXISTS question_documents_chapter ON question_documents (doc_hash, chapter);
+CREATE TABLE IF NOT EXISTS question_minhash (
+    question_id INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS question_lsh (
+    band_key INTEGER NOT NULL,
+    question_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS question_lsh_key ON question_lsh (band_key);
+"""
+
+_COLUMNS = "id, doc_hash, source_hash, chapter, page, stem, options, answer, created_at, difficulty"
+
+
+def _row_to_question(row):
+    question = dict(zip(_COLUMNS.split(", "), row))
+    question["options"] = json.loads(question["options"])
+    return question
+
+
+# Class wrapping one SQLite connection shared by the threads of a process
+class QuestionBank:
+    def __init__(self, path=DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.conn.executescript(SCHEMA)
+        if "questions" in tables and "question_documents" not in tables:
+            # Banks created before document links: every question belongs to the document it was generated from
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO question_documents (doc_hash, question_id, chapter, page)"
+                                  " SELECT doc_hash, id, chapter, page FROM questions")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(questions)")}
+        if "difficulty" not in columns:
+            # Banks created before difficulty was recorded
+            self.conn.execute("ALTER TABLE questions ADD COLUMN difficulty TEXT")
+        self.hasher = dedup.MinHasher()
+        if "questions" in tables and "question_minhash" not in tables:
+            # Banks created before deduplication: sign their questions so new ones are checked against them
+            self.index_missing_signatures()
+
+    def close(self):
+        self.conn.close()
+
+    # Return the id of a stored near-duplicate of a signature, or None (caller holds the lock)
+    def _find_duplicate(self, signature, keys):
+        placeholders = ",".join("?" * len(keys))
+        candidates = self.conn.execute(
+            "SELECT m.question_id, m.signature FROM question_minhash m WHERE m.question_id IN"
+            f" (SELECT DISTINCT question_id FROM question_lsh WHERE band_key IN ({placeholders}))",
+            keys,
+        )
+        best_id, best = None, dedup.THRESHOLD
+        for question_id, stored in candidates:
+            score = dedup.similarity(signature, dedup.from_bytes(stored))
+            if score >= best:
+                best_id, best = question_id, score
+        return best_id
+
+    def _index_signature(self, question_id, signature, keys):
+        self.conn.execute("INSERT OR REPLACE INTO question_minhash (question_id, signature) VALUES (?, ?)",
+                          (question_id, dedup.to_bytes(signature)))
+        self.conn.executemany("INSERT INTO question_lsh (band_key, question_id) VALUES (?, ?)",
+                              [(key, question_id) for key in keys])
+
+    # Id of a stored near-duplicate of a question, or None
+    def find_duplicate(self, question):
+        signature = self.hasher.signature(dedup.question_text(question))
+        with self.lock:
+            return self._find_duplicate(signature, self.hasher.band_keys(signature))
+
+    # Store questions, skipping near-duplicates of stored ones; returns the id each question maps to
+    def add_questions(self, questions, doc_hash, source_hash, chapter=None, page=None):
+        now = time.time()
+        ids = []
+        with self.lock, self.conn:
+            for question in questions:
+                signature = self.hasher.signature(dedup.question_text(question))
+                keys = self.hasher.band_keys(signature)
+                question_id = self._find_duplicate(signature, keys)
+                if question_id is not None:
+                    metrics.QUESTIONS_DEDUPLICATED.inc()
+                else:
+                    cursor = self.conn.execute(
+                        "INSERT INTO questions"
+                        " (doc_hash, source_hash, chapter, page, stem, options, answer, created_at, difficulty)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (doc_hash, source_hash, chapter, page, question["stem"],
+                         json.dumps(question["options"]), question.get("answer"), now, question.get("difficulty")),
+                    )
+                    question_id = cursor.lastrowid
+                    self._index_signature(question_id, signature, keys)
+                self.conn.execute("INSERT OR IGNORE INTO question_sources (source_hash, question_id) VALUES (?, ?)",
+                                  (source_hash, question_id))
+                self.conn.execute("INSERT OR IGNORE INTO question_documents (doc_hash, question_id, chapter, page)"
+                                  " VALUES (?, ?, ?, ?)", (doc_hash, question_id, chapter, page))
+                ids.append(question_id)
+        return ids
+
+    # Compute signatures for questions stored before deduplication existed; returns how many
+    def index_missing_signatures(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, stem, options FROM questions WHERE id NOT IN (SELECT question_id FROM question_minhash)"
+            ).fetchall()
+            with self.conn:
+                for question_id, stem, options in rows:
+                    signature = self.hasher.signature(dedup.question_text({"stem": stem, "options": json.loads(options)}))
+                    self._index_signature(question_id, signature, self.hasher.band_keys(signature))
+        return len(rows)
+
+    def _select(self, where, params, limit=None):
+        sql = f"SELECT {_COLUMNS} FROM questions WHERE {where} ORDER BY id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.lock:
+            return [_row_to_question(row) for row in self.conn.execute(sql, params)]
+
+    # Questions generated from exactly this source slice (including deduplicated ones)
+    def for_source(self, source_hash):
+        return self._select(
+            "source_hash = ? OR id IN (SELECT question_id FROM question_sources WHERE source_hash = ?)",
+            (source_hash, source_hash),
+        )
+
+    # Questions for a document (including ones deduplicated against another document), optionally one chapter of it.
+    # Chapter and page are where the question appears in this document.
+    def for_document(self, doc_hash, chapter=None):
+        columns = ", ".join(f"d.{c}" if c in ("doc_hash", "chapter", "page") else f"q.{c}" for c in _COLUMNS.split(", "))
+        sql = (f"SELECT {columns} FROM question_documents d JOIN questions q ON q.id = d.question_id"
+               " WHERE d.doc_hash = ?")
+        params = [doc_hash]
+        if chapter is not None:
+            sql += " AND d.chapter = ?"
+            params.append(chapter)
+        with self.lock:
+            return [_row_to_question(row) for row in self.conn.execute(sql + " ORDER BY q.id", params)]
+
+    # Every stored question
+    def all_questions(self):
+        return self._select("1", ())
+
+    # Look questions up by id, in the order given
+    def get(self, ids):
+        ids = list(ids)
+        if not ids:
+            return []
+        found = {q["id"]: q for q in self._select(f"id IN ({','.join('?' * len(ids))})", ids)}
+        return [found[i] for i in ids if i in found]
+
+    # Full-text search over question stems, best matches first
+    def search(self, query, limit=20):
+        sql = (f"SELECT {', '.join('q.' + c for c in _COLUMNS.split(', '))} FROM questions_fts"
+               " JOIN questions q ON q.id = questions_fts.rowid"
+               " WHERE questions_fts MATCH ? ORDER BY bm25(questions_fts) LIMIT ?")
+        # Quote each word so user input is never parsed as FTS5 query syntax
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+        if not match:
+            return []
+        with self.lock:
+            return [_row_to_question(row) for row in self.conn.execute(sql, (match, limit))]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+
+_default_bank = None
+_default_lock = threading.Lock()
+
+
+# Function to get the process-wide bank at DB_PATH (shared across Streamlit sessions)
+def default_bank():
+    global _default_bank
+    with _default_lock:
+        if _default_bank is None:
+            _default_bank = QuestionBank()
+        return _default_bank
+
+
+# Function to serve questions for a text slice from the bank, generating and storing them on a miss
+def get_or_generate(bank, source_text, doc_hash, chapter=None, page=None, complete=openai_complete, prompt=MCQ_PROMPT,
+                    user=None):
+    source_hash = document_hash(source_text)
+    questions = bank.for_source(source_hash)
+    metrics.record_cache("question_bank", bool(questions))
+    if questions:
+        return questions, True
+    generated = parse_mcqs(generate_mcqs(source_text, complete=complete, prompt=prompt, user=user, doc_hash=doc_hash))
+    ids = bank.add_questions(generated, doc_hash, source_hash, chapter, page)
+    return bank.get(dict.fromkeys(ids)), False
+
+
+# Function to render a stored question as Markdown
+def format_question(question, number=None):
+    prefix = f"**{number}.** " if number is not None else ""
+    lines = [prefix + question["stem"]]
+    for letter, option in zip("abcde", question["options"]):
+        lines.append(f"- {letter}) {option}")
+    if question.get("answer"):
+        lines.append(f"\n*Answer: {question['answer']}*")
+    return "\n".join(lines)
@@ -0,0 +1,170 @@
+# Record-and-replay of LLM traffic for offline, deterministic load tests.
+#
+# Recording: with LLM_JOURNAL_PATH set, generate_mcqs appends every successful
+# request/response pair to that JSONL file, with the prompt, its key (SHA-1 of
+# the prompt), the response as returned and the latency observed:
+#
+#   LLM_JOURNAL_PATH=data/llm-journal.jsonl streamlit run main.py
+#
+# Replay, in process: replay_complete(Journal(path)) is a completion function
+# that returns the recorded response for a prompt after sleeping its recorded
+# latency times latency_scale (0 replays instantly, 2 simulates a provider twice
+# as slow). Strict replay fails on a prompt that was never recorded; otherwise
+# an unknown prompt gets a recorded entry picked by its key, so the same prompt
+# always gets the same answer.
+#
+# Replay, over HTTP: serve() answers POST /v1/completions like the OpenAI API,
+# so the unmodified app, API and workers can be load-tested against it:
+#
+#   python replay.py serve data/llm-journal.jsonl --port 8765 --latency-scale 0.5
+#   OPENAI_API_BASE=http://localhost:8765/v1 OPENAI_API_KEY=replay python worker.py
+#
+# Calls replayed over HTTP look like real OpenAI calls to the usage ledger, so
+# point LEDGER_PATH at a scratch file for load tests.
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLAY_PORT = 8765
+
+_journal_lock = threading.Lock()
+
+
+# Function to key a prompt in the journal
+def prompt_key(prompt):
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+# Function to append one request/response pair to a journal file
+def record(path, prompt, response, latency):
+    line = json.dumps({
+        "key": prompt_key(prompt), "prompt": prompt, "response": response, "latency": latency,
+        "recorded_at": time.time(),
+    }) + "\n"
+    directory = os.path.dirname(os.path.abspath(path))
+    with _journal_lock:
+        os.makedirs(directory, exist_ok=True)
+        # One write per line in append mode, so concurrent workers do not interleave lines
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+# Class holding a journal's entries, indexed by prompt key
+class Journal:
+    def __init__(self, path):
+        self.entries = []
+        self.by_key = {}
+        self.served = {}
+        self.lock = threading.Lock()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.append(entry)
+                    self.by_key.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Recorded entry for a prompt, cycling through repeated recordings of it; None when strict and unknown
+    def lookup(self, prompt, strict=True):
+        key = prompt_key(prompt)
+        recorded = self.by_key.get(key)
+        if recorded:
+            with self.lock:
+                count = self.served.get(key, 0)
+                self.served[key] = count + 1
+            return recorded[count % len(recorded)]
+        if strict or not self.entries:
+            return None
+        return self.entries[int(key, 16) % len(self.entries)]
+
+    # Latency statistics of the recorded traffic
+    def stats(self):
+        latencies = sorted(entry["latency"] for entry in self.entries)
+        if not latencies:
+            return {"entries": 0}
+        return {
+            "entries": len(latencies), "prompts": len(self.by_key), "mean_latency": statistics.fmean(latencies),
+            "p50_latency": latencies[len(latencies) // 2], "p95_latency": latencies[int(len(latencies) * 0.95)],
+            "max_latency": latencies[-1],
+        }
+
+
+# Function to build a completion function that replays a journal
+def replay_complete(journal, latency_scale=1.0, strict=True):
+    def complete(prompt, max_tokens=None):
+        entry = journal.lookup(prompt, strict)
+        if entry is None:
+            raise KeyError(f"prompt {prompt_key(prompt)} is not in the journal")
+        if latency_scale:
+            time.sleep(entry["latency"] * latency_scale)
+        return json.loads(json.dumps(entry["response"]))
+    complete.provider = "replay"
+    return complete
+
+
+# Function to serve a journal over HTTP as an OpenAI-compatible completions endpoint (blocks)
+def serve(journal, port=REPLAY_PORT, host="127.0.0.1", latency_scale=1.0, strict=True):
+    complete = replay_complete(journal, latency_scale, strict)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.split("?")[0].rstrip("/") not in ("/v1/completions", "/completions"):
+                self._reply(404, {"error": {"message": f"no route {self.path}", "type": "invalid_request_error"}})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = request.get("prompt", "")
+            if isinstance(prompt, list):
+                prompt = prompt[0] if prompt else ""
+            try:
+                self._reply(200, complete(prompt, request.get("max_tokens")))
+            except KeyError as error:
+                self._reply(404, {"error": {"message": str(error), "type": "invalid_request_error"}})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded LLM traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_command = commands.add_parser("serve", help="serve a journal as an OpenAI-compatible completions endpoint")
+    serve_command.add_argument("journal")
+    serve_command.add_argument("--host", default="127.0.0.1")
+    serve_command.add_argument("--port", type=int, default=REPLAY_PORT)
+    serve_command.add_argument("--latency-scale", type=float, default=1.0, help="multiply recorded latencies (0: none)")
+    serve_command.add_argument("--lenient", action="store_true", help="answer unknown prompts with a recorded entry")
+    stats_command = commands.add_parser("stats", help="summarize a journal")
+    stats_command.add_argument("journal")
+    args = parser.parse_args()
+
+    journal = Journal(args.journal)
+    if args.command == "stats":
+        print(json.dumps(journal.stats(), indent=2))
+        return
+    print(f"replaying {len(journal)} responses on http://{args.host}:{args.port}/v1", flush=True)
+    serve(journal, args.port, args.host, args.latency_scale, strict=not args.lenient)
+
+
+if __name__ == "__main__":
+    main()
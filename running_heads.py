@@ -0,0 +1,115 @@
+# Running-header, footer and page-number stripping by cross-page frequency analysis.
+#
+# Book pages repeat the same furniture at their edges: a running head such as
+# "CHAPTER 9 ADRENERGIC SYSTEM AND DRUGS" on every page of a chapter, and a page
+# number, often glued to the neighbouring text ("parkinsonism.133"). Line by line
+# neither can be told apart from body text, but across pages they stand out.
+#
+# One pass over the first and last EDGE_LINES lines of every page tracks, per
+# line key (lowercased, digits collapsed to "#", punctuation and spaces dropped),
+# how many pages in a row it occurs on, allowing a gap of one page for heads that
+# alternate between left and right pages. Keys seen on MIN_REPEATS or more pages
+# in such a run are running heads; a subheading like "Adverse effects" that
+# merely recurs at the top of scattered pages is not. The same pass collects the
+# numbers at each page's edges and tracks the offset between printed number and
+# page index the same way: an offset holding over a run of pages is a page
+# numbering, and numbers off it (a dose, a table cell) are left alone. A second pass drops the
+# furniture from each page's edges only, so body lines in the middle of a page
+# are never touched.
+import re
+
+EDGE_LINES = 3
+MIN_REPEATS = 3
+# A running head may skip this many pages and still count as the same run (left/right page heads)
+MAX_GAP = 2
+# Longer lines are body text, not running heads
+MAX_HEAD_CHARS = 100
+
+_DIGITS = re.compile(r"\d+")
+_NOT_KEY = re.compile(r"[^a-z#]+")
+_WHOLE_NUMBER = re.compile(r"^\s*(?:page\s*)?[-–]?\s*(\d{1,4})\s*[-–]?\s*$", re.IGNORECASE)
+# A number followed by "." or ")" starts a numbered list item, not a page
+_LEADING_NUMBER = re.compile(r"^\s*(\d{1,4})(?=[^\d.):,])")
+_TRAILING_NUMBER = re.compile(r"(?<=\D)(\d{1,4})\s*$")
+
+
+# Function to reduce a line to the key running heads are counted by ("CHAPTER 9ADRENERGIC" -> "chapter#adrenergic")
+def _key(line):
+    if len(line) > MAX_HEAD_CHARS:
+        return None
+    key = _NOT_KEY.sub("", _DIGITS.sub("#", line.lower()))
+    # Keys need a few letters: bare numbers and bullets are not running heads
+    return key if len(key) - key.count("#") >= 3 else None
+
+
+def _edges(lines, edge_lines):
+    count = len(lines)
+    return sorted(set(range(min(edge_lines, count))) | set(range(max(count - edge_lines, 0), count)))
+
+
+# Function to count an item as seen on a page; returns True once it has occurred on min_repeats pages in a run
+def _seen(runs, item, index, min_repeats):
+    run = runs.get(item)
+    if run is None or index - run[0] > MAX_GAP:
+        run = runs[item] = [index, 0]
+    run[0] = index
+    run[1] += 1
+    return run[1] >= min_repeats
+
+
+# Function to find the line keys repeated across pages and the page-number offsets (printed number - page index)
+def learn(pages, edge_lines=EDGE_LINES, min_repeats=MIN_REPEATS):
+    # item -> [last page seen, current run length]
+    key_runs = {}
+    offset_runs = {}
+    heads = set()
+    offsets = set()
+    for index, page in enumerate(pages):
+        lines = page.split("\n")
+        keys = set()
+        numbers = set()
+        for i in _edges(lines, edge_lines):
+            line = lines[i]
+            key = _key(line)
+            if key:
+                keys.add(key)
+            for pattern in (_WHOLE_NUMBER, _LEADING_NUMBER, _TRAILING_NUMBER):
+                match = pattern.search(line)
+                if match:
+                    numbers.add(int(match.group(1)) - index)
+        heads.update(key for key in keys if _seen(key_runs, key, index, min_repeats))
+        offsets.update(offset for offset in numbers if _seen(offset_runs, offset, index, min_repeats))
+    return heads, offsets
+
+
+# Function to drop learned running heads and page numbers from the edges of one page
+def strip_page(page, index, heads, offsets, edge_lines=EDGE_LINES):
+    lines = page.split("\n")
+    edges = _edges(lines, edge_lines)
+    drop = {i for i in edges if _key(lines[i]) in heads}
+
+    def is_page_number(match):
+        return match is not None and int(match.group(1)) - index in offsets
+
+    for i in edges:
+        if i not in drop and is_page_number(_WHOLE_NUMBER.match(lines[i])):
+            drop.add(i)
+    kept = [i for i in range(len(lines)) if i not in drop]
+    # A page number glued to the first or last remaining line ("133Atropine", "parkinsonism.133")
+    if kept and kept[0] in edges:
+        match = _LEADING_NUMBER.match(lines[kept[0]])
+        if is_page_number(match):
+            lines[kept[0]] = lines[kept[0]][match.end():].lstrip()
+    if kept and kept[-1] in edges:
+        match = _TRAILING_NUMBER.search(lines[kept[-1]])
+        if is_page_number(match):
+            lines[kept[-1]] = lines[kept[-1]][:match.start()].rstrip()
+    return "\n".join(lines[i] for i in kept)
+
+
+# Function to strip running heads, footers and page numbers from a document's per-page text
+def strip_running_heads(pages, edge_lines=EDGE_LINES, min_repeats=MIN_REPEATS):
+    heads, offsets = learn(pages, edge_lines, min_repeats)
+    if not heads and not offsets:
+        return list(pages)
+    return [strip_page(page, index, heads, offsets, edge_lines) for index, page in enumerate(pages)]
@@ -0,0 +1,161 @@
+# Spaced-repetition review scheduler over the question bank (SM-2).
+#
+# Card state lives in the review_cards table of the question bank database, with
+# an index on (student, due) so the earliest cards of a student come straight off
+# the index. Each student's due queue is also kept as an in-memory heap of
+# (due, question_id): fetching the next n due cards pops n entries (O(n log N))
+# instead of sorting the whole deck. Entries made stale by a later review are
+# skipped lazily by checking them against the card's current due time.
+#
+# Replicas share the database, not their heaps: when another connection has
+# committed since a student's heap was loaded (SQLite's data_version changes), the
+# heap is reloaded from the index before use, so cards added or reviewed by another
+# process are seen here too.
+import heapq
+import threading
+import time
+
+import question_bank
+
+DAY = 86400.0
+MIN_EASE = 1.3
+START_EASE = 2.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_cards (
+    student TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    due REAL NOT NULL,
+    interval REAL NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    reps INTEGER NOT NULL DEFAULT 0,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    last_review REAL,
+    PRIMARY KEY (student, question_id)
+);
+CREATE INDEX IF NOT EXISTS review_cards_due ON review_cards (student, due);
+"""
+
+
+# Function to apply one SM-2 step; quality is 0 (blackout) to 5 (perfect recall)
+def sm2(interval, ease, reps, lapses, quality):
+    if quality < 3:
+        return 1.0, max(MIN_EASE, ease - 0.2), 0, lapses + 1
+    reps += 1
+    if reps == 1:
+        interval = 1.0
+    elif reps == 2:
+        interval = 6.0
+    else:
+        interval = round(interval * ease)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return interval, ease, reps, lapses
+
+
+# Class scheduling reviews for many students on top of a QuestionBank connection
+class ReviewScheduler:
+    def __init__(self, bank):
+        self.bank = bank
+        self.lock = threading.Lock()
+        self.heaps = {}
+        self.due = {}
+        self.versions = {}
+        with bank.lock:
+            bank.conn.executescript(SCHEMA)
+
+    # Load a student's due queue from the index when first needed, or when another connection has written
+    # since it was loaded (caller holds self.lock)
+    def _heap(self, student):
+        with self.bank.lock:
+            version = self.bank.conn.execute("PRAGMA data_version").fetchone()[0]
+        heap = self.heaps.get(student)
+        if heap is None or self.versions[student] != version:
+            with self.bank.lock:
+                rows = self.bank.conn.execute(
+                    "SELECT due, question_id FROM review_cards WHERE student = ? ORDER BY due", (student,)
+                ).fetchall()
+            self.versions[student] = version
+            # Rows arrive sorted by due, which is already a valid heap
+            heap = self.heaps[student] = [tuple(row) for row in rows]
+            self.due[student] = {question_id: due for due, question_id in rows}
+        return heap
+
+    # Put questions in a student's deck, due immediately; cards already there are left alone
+    def add_cards(self, student, question_ids, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            heap = self._heap(student)
+            due = self.due[student]
+            new = [question_id for question_id in dict.fromkeys(question_ids) if question_id not in due]
+            with self.bank.lock, self.bank.conn:
+                self.bank.conn.executemany(
+                    "INSERT OR IGNORE INTO review_cards (student, question_id, due, ease) VALUES (?, ?, ?, ?)",
+                    [(student, question_id, now, START_EASE) for question_id in new],
+                )
+            for question_id in new:
+                due[question_id] = now
+                heapq.heappush(heap, (now, question_id))
+        return len(new)
+
+    # The next n question ids due at `now`, earliest first
+    def next_due(self, student, n=50, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            heap = self._heap(student)
+            due = self.due[student]
+            taken = []
+            while heap and len(taken) < n and heap[0][0] <= now:
+                entry = heapq.heappop(heap)
+                if due.get(entry[1]) == entry[0]:
+                    taken.append(entry)
+            for entry in taken:
+                heapq.heappush(heap, entry)
+        return [question_id for _, question_id in taken]
+
+    # Number of cards due at `now`, answered from the (student, due) index
+    def due_count(self, student, now=None):
+        now = time.time() if now is None else now
+        with self.bank.lock:
+            return self.bank.conn.execute(
+                "SELECT COUNT(*) FROM review_cards WHERE student = ? AND due <= ?", (student, now)
+            ).fetchone()[0]
+
+    # Record a review and reschedule the card; returns the new due time
+    def review(self, student, question_id, quality, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            heap = self._heap(student)
+            with self.bank.lock, self.bank.conn:
+                row = self.bank.conn.execute(
+                    "SELECT interval, ease, reps, lapses FROM review_cards WHERE student = ? AND question_id = ?",
+                    (student, question_id),
+                ).fetchone()
+                if row is None:
+                    raise KeyError(f"question {question_id} is not in {student}'s deck")
+                interval, ease, reps, lapses = sm2(*row, quality)
+                due = now + interval * DAY
+                self.bank.conn.execute(
+                    "UPDATE review_cards SET due = ?, interval = ?, ease = ?, reps = ?, lapses = ?, last_review = ?"
+                    " WHERE student = ? AND question_id = ?",
+                    (due, interval, ease, reps, lapses, now, student, question_id),
+                )
+            self.due[student][question_id] = due
+            heapq.heappush(heap, (due, question_id))
+            if len(heap) > 2 * len(self.due[student]) + 64:
+                # Drop stale entries once they outnumber live ones
+                heap[:] = [(d, q) for q, d in self.due[student].items()]
+                heapq.heapify(heap)
+        return due
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+# Function to get the process-wide scheduler over the default question bank
+def default_scheduler():
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ReviewScheduler(question_bank.default_bank())
+        return _default_scheduler
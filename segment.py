@@ -0,0 +1,180 @@
+# Chapter and section segmentation over extracted (normalized) text.
+#
+# Chapters come from the PDF outline when the file has one, otherwise from the
+# "Chapter N" banner lines that normalize.py leaves behind, with the title taken
+# from the lines just above the banner. Sections are the all-caps headings inside
+# a chapter ("CLASSIFICATION", "PHARMACOLOGICAL ACTIONS", ...). Offsets index into
+# the text the segments were built from, so a chapter's slice is text[start:end].
+import bisect
+import re
+from collections import namedtuple
+
+from PyPDF2 import PdfReader
+
+# level is "chapter" or "section"; for sections, number is the enclosing chapter's number
+Segment = namedtuple("Segment", ["level", "number", "title", "start", "end"])
+# A top-level outline entry as a page range: pages start_page .. end_page - 1 (0-based)
+OutlineChapter = namedtuple("OutlineChapter", ["title", "start_page", "end_page"])
+
+_BANNER = re.compile(r"(?m)^Chapter (\d+)[ \t]*$")
+_HEADING = re.compile(r"(?m)^[A-Z][A-Z0-9 ,\-()/&']{3,}$")
+# All-caps running heads repeated on every page ("SECTION 2DRUGS ACTING ON ANS")
+_RUNNING_HEAD = re.compile(r"^(?:CHAPTER|SECTION) \d+")
+# Boundary where a title has been glued onto the end of the previous paragraph
+_GLUED = re.compile(r"[a-z.,;)](?=[A-Z][A-Za-z])")
+_TITLE_LINES = 3
+_TITLE_CONNECTORS = {"and", "of", "for", "on", "in", "the", "with", "to", "&"}
+
+
+# Function to find where the trailing run of title-case words in a line begins
+def _title_tail(line):
+    words = line.split(" ")
+    i = len(words)
+    while i > 0:
+        word = words[i - 1].lstrip("(")
+        if not word or not (word[0].isupper() or word in _TITLE_CONNECTORS):
+            break
+        i -= 1
+    while 0 < i < len(words) and words[i] in _TITLE_CONNECTORS:
+        i += 1
+    return len(" ".join(words[:i])) + (1 if i else 0)
+
+
+# Function to recover the chapter title printed just above a "Chapter N" banner
+def _banner_title(text, banner_start):
+    start = banner_start
+    parts = []
+    for _ in range(_TITLE_LINES):
+        line_end = start - 1
+        if line_end <= 0:
+            break
+        line_start = text.rfind("\n", 0, line_end) + 1
+        line = text[line_start:line_end]
+        glued = None
+        for glued in _GLUED.finditer(line):
+            pass
+        if glued is not None:
+            parts.insert(0, line[glued.end():])
+            start = line_start + glued.end()
+            break
+        if not line.strip() or line.rstrip()[-1] in ".:;" or line.isupper():
+            break
+        tail = _title_tail(line)
+        if tail < len(line):
+            parts.insert(0, line[tail:])
+            start = line_start + tail
+        if tail:
+            break
+    return " ".join(part.strip() for part in parts), start
+
+
+# Function to find chapters from "Chapter N" banners
+def _chapters_from_banners(text):
+    chapters = []
+    for match in _BANNER.finditer(text):
+        title, start = _banner_title(text, match.start())
+        chapters.append((match.group(1), title or match.group(0), start))
+    return chapters
+
+
+# Function to find chapters from a PDF outline, given where each page starts in the text
+def _chapters_from_outline(outline, page_starts):
+    chapters = []
+    for level, title, page in outline:
+        if level == 0 and page is not None and page < len(page_starts):
+            chapters.append((str(len(chapters) + 1), title, page_starts[page]))
+    return chapters
+
+
+# Function to read the top-level PDF outline as (level, title, page index) entries
+def read_outline(file):
+    file.seek(0)
+    reader = PdfReader(file)
+    entries = []
+
+    def walk(items, level):
+        for item in items:
+            if isinstance(item, list):
+                walk(item, level + 1)
+                continue
+            try:
+                page = reader.get_destination_page_number(item)
+            except Exception:
+                page = None
+            entries.append((level, item.title, page))
+
+    try:
+        walk(reader.outline, 0)
+    except Exception:
+        # Broken or missing outline trees are common; fall back to banner detection
+        return []
+    file.seek(0)
+    return entries
+
+
+# Function to turn the top-level outline entries into page ranges, so chapters can be chosen before extraction
+def outline_chapters(outline, page_count):
+    tops = sorted((page, title) for level, title, page in outline if level == 0 and page is not None and page < page_count)
+    ranges = []
+    for i, (page, title) in enumerate(tops):
+        end = tops[i + 1][0] if i + 1 < len(tops) else page_count
+        if end > page:
+            ranges.append(OutlineChapter(title, page, end))
+    return ranges
+
+
+# Function to list the page indexes covered by some outline chapters
+def chapter_pages(chapters):
+    return sorted({page for chapter in chapters for page in range(chapter.start_page, chapter.end_page)})
+
+
+# Function to build the chapter/section index for a text
+def build_index(text, outline=None, page_starts=None):
+    if outline and page_starts:
+        chapters = _chapters_from_outline(outline, page_starts)
+    else:
+        chapters = []
+    if not chapters:
+        chapters = _chapters_from_banners(text)
+    chapters.sort(key=lambda chapter: chapter[2])
+
+    index = []
+    for i, (number, title, start) in enumerate(chapters):
+        end = chapters[i + 1][2] if i + 1 < len(chapters) else len(text)
+        index.append(Segment("chapter", number, title, start, end))
+
+    headings = [m for m in _HEADING.finditer(text) if not _RUNNING_HEAD.match(m.group())]
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        chapter = chapter_at(index, match.start())
+        if chapter is not None:
+            end = min(end, chapter.end)
+        index.append(Segment("section", chapter.number if chapter else None, match.group(), match.start(), end))
+
+    index.sort(key=lambda segment: (segment.start, segment.level != "chapter"))
+    return index
+
+
+# Function to list just the chapters of an index
+def chapters(index):
+    return [segment for segment in index if segment.level == "chapter"]
+
+
+# Function to find the chapter containing a text offset
+def chapter_at(index, offset):
+    found = chapters(index)
+    starts = [segment.start for segment in found]
+    i = bisect.bisect_right(starts, offset) - 1
+    if i >= 0 and offset < found[i].end:
+        return found[i]
+    return None
+
+
+# Function to list the sections of one chapter
+def sections(index, chapter_number):
+    return [segment for segment in index if segment.level == "section" and segment.number == chapter_number]
+
+
+# Function to return the text of a segment
+def segment_text(text, segment):
+    return text[segment.start:segment.end]
@@ -0,0 +1,63 @@
+# Upload spooling: uploads are copied to disk and read back through mmap.
+#
+# A 200 MB scanned textbook held as bytes costs 200 MB of RSS per session, and
+# every .read() or .getvalue() along the way costs another copy. Instead, an
+# upload is copied to a spool file COPY_CHUNK bytes at a time and the extractor
+# opens the spool file. PyMuPDF (the default text backend, and page
+# rasterization for OCR) opens the path itself, so file contents live in the
+# kernel page cache, shared and evictable, rather than in the process heap, and
+# memory per session is bounded by the page being worked on, not by the size of
+# the file. PyPDF2 reads the spool file through a read-only mmap, which saves the
+# upload's bytes but not the objects it parses from them: with that backend a
+# session still costs about the file's size (see bench_upload_rss).
+import contextlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "exam-agent-uploads"))
+COPY_CHUNK = 1 << 20
+# Spool files older than this are removed when new uploads arrive
+SPOOL_TTL = 24 * 3600.0
+
+
+# Function to copy an upload (bytes or a file object) into a spool file a chunk at a time; returns its path
+def spool_upload(source, suffix="", directory=SPOOL_DIR):
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            f.write(source)
+        else:
+            source.seek(0)
+            shutil.copyfileobj(source, f, COPY_CHUNK)
+    return path
+
+
+# Context manager mapping a spooled file read-only, as a file-like object for PyPDF2
+@contextlib.contextmanager
+def mapped(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            yield io.BytesIO()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+
+# Function to delete spool files older than max_age seconds
+def purge(max_age=SPOOL_TTL, directory=SPOOL_DIR, now=None):
+    now = time.time() if now is None else now
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < now - max_age:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry.path)
+                removed += 1
+    return removed
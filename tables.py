@@ -0,0 +1,171 @@
+# Table detection from PyMuPDF word boxes.
+#
+# page.extract_text() flattens a table into jumbled lines, which costs tokens and
+# loses which value belongs to which drug. Here a page's words (with their
+# boxes) are grouped into rows by baseline, each row is split into cells at wide
+# horizontal gaps, and runs of rows whose cells line up on shared column starts
+# become tables. Rows whose first column is empty continue the row above (a
+# wrapped cell). Two-column prose also splits into "cells", but its cells are
+# whole lines of text, so runs whose cells average more than MAX_WORDS_PER_CELL
+# words are rejected. A "Table 10.1 ..." line just above a table is its caption.
+#
+# Detection results are cached on disk per page, keyed by a digest of the PDF
+# file, so a page is only analysed once however many sessions open the book.
+import hashlib
+import json
+import os
+import statistics
+from collections import namedtuple
+
+import glyphs
+import metrics
+import spool
+
+TABLE_CACHE_DIR = os.getenv("TABLE_CACHE_DIR", os.path.join("data", "tables"))
+
+# Distances are in multiples of the page's median word height
+ROW_TOLERANCE = 0.5
+CELL_GAP = 1.5
+COLUMN_TOLERANCE = 1.0
+MAX_ROW_GAP = 2.5
+MIN_ROWS = 3
+MAX_WORDS_PER_CELL = 5.0
+CAPTION_LOOKBACK = 3
+
+Table = namedtuple("Table", ["page", "caption", "header", "rows", "bbox"])
+
+_digests = {}
+
+
+# Function to fingerprint a spooled PDF (memoized by path, size and mtime)
+def file_digest(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    digest = _digests.get(key)
+    if digest is None:
+        with spool.mapped(path) as view:
+            digest = _digests[key] = hashlib.sha1(view).hexdigest()
+    return digest
+
+
+# Function to group word boxes into rows of (y0, y1, cells), each cell being [x0, x1, text]
+def _rows(words, height):
+    rows = []
+    for x0, y0, x1, y1, word, *_ in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        center = (y0 + y1) / 2
+        if rows and center - rows[-1]["center"] <= ROW_TOLERANCE * height:
+            rows[-1]["words"].append((x0, x1, word))
+            rows[-1]["y1"] = max(rows[-1]["y1"], y1)
+        else:
+            rows.append({"center": center, "y0": y0, "y1": y1, "words": [(x0, x1, word)]})
+    result = []
+    for row in rows:
+        cells = []
+        for x0, x1, word in sorted(row["words"]):
+            if cells and x0 - cells[-1][1] <= CELL_GAP * height:
+                cells[-1][1] = x1
+                cells[-1][2] += " " + word
+            else:
+                cells.append([x0, x1, word])
+        result.append((row["y0"], row["y1"], cells))
+    return result
+
+
+# Function to turn a run of rows into a Table, or None when the cells do not form one
+def _table(run, height, page_index, caption):
+    starts = sorted(cell[0] for _, _, cells in run for cell in cells)
+    columns = [starts[0]]
+    for x in starts[1:]:
+        if x - columns[-1] > COLUMN_TOLERANCE * height:
+            columns.append(x)
+    if len(columns) < 2:
+        return None
+    words = [len(cell[2].split()) for _, _, cells in run for cell in cells]
+    if sum(words) / len(words) > MAX_WORDS_PER_CELL:
+        return None
+
+    grid = []
+    for _, _, cells in run:
+        row = [""] * len(columns)
+        for x0, _, text in cells:
+            column = max(i for i, start in enumerate(columns) if start <= x0 + COLUMN_TOLERANCE * height)
+            row[column] = (row[column] + " " + text).strip()
+        if grid and not row[0]:
+            # A wrapped cell: continue the row above
+            grid[-1] = [(above + " " + below).strip() for above, below in zip(grid[-1], row)]
+        else:
+            grid.append(row)
+    if len(grid) < MIN_ROWS or sum(1 for row in grid if sum(1 for cell in row if cell) >= 2) < len(grid) / 2:
+        return None
+    x0 = min(cell[0] for _, _, cells in run for cell in cells)
+    x1 = max(cell[1] for _, _, cells in run for cell in cells)
+    return Table(page_index, caption, grid[0], grid[1:], (x0, run[0][0], x1, run[-1][1]))
+
+
+# Function to find the tables on one PyMuPDF page
+def detect_tables(page, page_index):
+    words = page.get_text("words")
+    if not words:
+        return []
+    height = statistics.median(w[3] - w[1] for w in words) or 1.0
+    rows = _rows(words, height)
+    tables = []
+    run = []
+    run_start = 0
+
+    def close(end):
+        if len(run) >= MIN_ROWS:
+            caption = None
+            for _, _, cells in reversed(rows[max(run_start - CAPTION_LOOKBACK, 0):run_start]):
+                line = " ".join(cell[2] for cell in cells)
+                if line.lower().startswith("table"):
+                    caption = line
+                    break
+            table = _table(run, height, page_index, caption)
+            if table is not None:
+                tables.append(table)
+
+    for i, row in enumerate(rows):
+        tabular = len(row[2]) >= 2
+        # Single-cell rows indented past the table's left edge continue a wrapped cell
+        continues = run and len(row[2]) == 1 and row[2][0][0] > run[0][2][0][0] + COLUMN_TOLERANCE * height
+        close_enough = run and row[0] - run[-1][1] <= MAX_ROW_GAP * height
+        if (tabular or continues) and (not run or close_enough):
+            if not run:
+                run_start = i
+            run.append(row)
+        else:
+            close(i)
+            run = [row] if tabular else []
+            run_start = i
+    close(len(rows))
+    return tables
+
+
+# Function to find the tables on some pages of a spooled PDF, using the per-page cache
+def tables_for_pages(path, page_numbers=None, root=TABLE_CACHE_DIR):
+    cache_dir = os.path.join(root, file_digest(path))
+    found = []
+    with glyphs.open_document(path) as doc:
+        wanted = range(doc.page_count) if page_numbers is None else [i for i in page_numbers if 0 <= i < doc.page_count]
+        for i in wanted:
+            cache_path = os.path.join(cache_dir, f"{i}.json")
+            if os.path.exists(cache_path):
+                metrics.record_cache("tables", True)
+                with open(cache_path, encoding="utf-8") as f:
+                    found.extend(Table(*entry) for entry in json.load(f))
+                continue
+            metrics.record_cache("tables", False)
+            page_tables = detect_tables(doc.load_page(i), i)
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(page_tables, f)
+            found.extend(page_tables)
+    return found
+
+
+# Function to render a table compactly for a prompt: caption, then one "a | b | c" line per row
+def to_text(table):
+    lines = [table.caption] if table.caption else []
+    lines.extend(" | ".join(row) for row in [table.header] + table.rows)
+    return "\n".join(lines)
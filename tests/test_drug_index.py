@@ -0,0 +1,23 @@
+# Aho-Corasick drug name matching and the entity index built on it.
+from drug_index import DrugMatcher, build_entity_index
+
+
+def test_scan_finds_whole_words_leftmost_longest():
+    matcher = DrugMatcher(["atropine", "atropine methonitrate", "pine", "neostigmine"])
+    text = "Atropine methonitrate and neostigmine; not atropinelike, nor pine-tar."
+    assert [name for _, _, name in matcher.scan(text)] == ["atropine methonitrate", "neostigmine", "pine"]
+    start, end, _ = matcher.scan(text)[0]
+    assert text[start:end] == "Atropine methonitrate"
+
+
+def test_scan_follows_failure_links_across_overlapping_names():
+    matcher = DrugMatcher(["he", "she", "hers", "his"])
+    assert matcher.scan("ushers his she") == [(7, 10, "his"), (11, 14, "she")]
+
+
+def test_entity_index_records_pages():
+    matcher = DrugMatcher(["atropine", "neostigmine"])
+    text = "atropine here\nneostigmine and atropine there"
+    index = build_entity_index(text, [0, 14], matcher)
+    assert sorted(index) == ["atropine", "neostigmine"]
+    assert len(index["atropine"]) == 2
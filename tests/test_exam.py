@@ -0,0 +1,90 @@
+# Mock exams and grading: timed sessions, batch scoring and item statistics.
+import numpy as np
+import pytest
+
+import grading
+from exam import ExamStore, is_examiner, stratified_sample
+from question_bank import QuestionBank
+
+
+def make_store(tmp_path, n_questions=10):
+    bank = QuestionBank(str(tmp_path / "bank.db"))
+    questions = [
+        {
+            "stem": f"Question {i}: which receptor does drug number {i * 37} act on in tissue {i * 11}?",
+            "options": [f"receptor {i}-{option}" for option in "abcd"],
+            "answer": "abcd"[i % 4],
+            "difficulty": ["easy", "medium", "hard"][i % 3],
+        }
+        for i in range(n_questions)
+    ]
+    bank.add_questions(questions, "doc", "source", chapter="1")
+    return ExamStore(bank)
+
+
+def test_response_matrix_and_scores():
+    responses = grading.response_matrix([{"0": "a", "1": "c"}, {0: "b", 2: "x", 5: "a"}, {}], 3)
+    assert responses.tolist() == [[0, 2, -1], [1, -1, -1], [-1, -1, -1]]
+    key = grading.key_vector(["a", "c", None])
+    correct, scores = grading.score(responses, key)
+    assert correct.tolist() == [[True, True, False], [False, False, False], [False, False, False]]
+    assert np.allclose(scores, [2 / 3, 0, 0])
+
+
+def test_item_analysis_statistics():
+    # Four students, two items: item 0 is answered correctly by the two best students only
+    responses = np.array([[0, 1], [0, 1], [1, 1], [2, -1]], dtype=np.int8)
+    analysis = grading.item_analysis(responses, grading.key_vector("ab"), n_options=4)
+    assert np.allclose(analysis["difficulty"], [0.5, 0.75])
+    assert analysis["discrimination"][0] == 1.0
+    assert analysis["point_biserial"][0] > 0
+    assert analysis["option_counts"][0].tolist() == [2, 1, 1, 0, 0]
+    assert analysis["option_counts"][1].tolist() == [0, 3, 0, 0, 1]
+    assert grading.difficulty_label(0.9) == "easy" and grading.difficulty_label(0.2) == "hard"
+
+
+def test_stratified_sample_keeps_group_proportions():
+    pool = [{"chapter": "1", "difficulty": "easy"}] * 30 + [{"chapter": "2", "difficulty": "hard"}] * 10
+    chosen = stratified_sample([dict(q, id=i) for i, q in enumerate(pool)], 8, seed=3)
+    assert len(chosen) == 8 and sum(q["chapter"] == "1" for q in chosen) == 6
+    assert len({q["id"] for q in chosen}) == 8
+
+
+def test_examiner_password_is_required():
+    assert is_examiner("secret", "secret")
+    assert not is_examiner("guess", "secret")
+    assert not is_examiner("", None) and not is_examiner("anything", None)
+
+
+def test_timed_session_saves_and_submits(tmp_path):
+    store = make_store(tmp_path)
+    paper_id = store.create_paper("Mock", 5, 10, "doc", seed=1)
+    paper = store.paper(paper_id)
+    assert len(paper["questions"]) == 5 and all(q["answer"] is None for q in paper["questions"])
+    session_id = store.start(paper_id, "ana", now=0)
+    assert store.remaining(session_id, now=60) == 540
+    assert store.open_sessions(paper_id, now=60) == 1
+    store.save_answers(session_id, {0: "a", 1: "b"}, now=60)
+    store.save_answers(session_id, {1: None, 2: "c"}, now=120)
+    assert store.session(session_id)["answers"] == {"0": "a", "2": "c"}
+    assert store.save_answers(session_id, {3: "d"}, submit=True, now=180)
+    assert store.remaining(session_id, now=200) == 0
+    assert store.open_sessions(paper_id, now=200) == 0
+    with pytest.raises(ValueError):
+        store.save_answers(session_id, {4: "a"}, now=200)
+
+
+def test_late_answers_are_dropped_and_grading_counts_saved_ones(tmp_path):
+    store = make_store(tmp_path)
+    paper_id = store.create_paper("Mock", 4, 1, "doc", seed=2)
+    key = store.paper(paper_id)["key"]
+    perfect = store.start(paper_id, "ana", now=0)
+    store.save_answers(perfect, dict(enumerate(key)), now=30)
+    late = store.start(paper_id, "ben", now=0)
+    store.save_answers(late, {0: key[0]}, now=30)
+    # After the deadline the session closes with what was saved in time
+    assert store.save_answers(late, dict(enumerate(key)), submit=True, now=90) is False
+    assert store.session(late)["answers"] == {"0": key[0]}
+    scores = store.grade_paper(paper_id, now=90)
+    assert scores == {perfect: 1.0, late: 0.25}
+    assert np.allclose(store.analyze_paper(paper_id, now=90)["difficulty"], [1.0, 0.5, 0.5, 0.5])
@@ -0,0 +1,101 @@
+# Durable job queue: priorities, retries with backoff, leases and their expiry.
+import os
+import time
+
+import job_queue
+from job_queue import LEASE_SECONDS, RETRY_DELAY, JobQueue
+
+
+def make_queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "spool"))
+
+
+def test_claim_takes_highest_priority_then_oldest(tmp_path):
+    queue = make_queue(tmp_path)
+    low = queue.enqueue("ocr", {"n": 1}, job_queue.PRIORITY_NORMAL)
+    high = queue.enqueue("ocr", {"n": 2}, job_queue.PRIORITY_INTERACTIVE)
+    later_low = queue.enqueue("ocr", {"n": 3}, job_queue.PRIORITY_NORMAL)
+    now = time.time()
+    assert [queue.claim("w", now=now)["id"] for _ in range(3)] == [high, low, later_low]
+    assert queue.claim("w", now=now) is None
+
+
+def test_claim_filters_by_kind(tmp_path):
+    queue = make_queue(tmp_path)
+    queue.enqueue("ocr", {})
+    mcqs = queue.enqueue("mcqs", {})
+    assert queue.claim("w", kinds=["mcqs"])["id"] == mcqs
+    assert queue.claim("w", kinds=["mcqs"]) is None
+
+
+def test_fail_retries_with_backoff_until_attempts_run_out(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("ocr", {}, max_attempts=2)
+    now = time.time()
+    assert queue.claim("w", now=now)["attempts"] == 1
+    queue.fail(job_id, "boom", now=now)
+    job = queue.get(job_id)
+    assert job["status"] == "queued" and job["run_after"] == now + RETRY_DELAY
+    # Not runnable before the backoff has passed
+    assert queue.claim("w", now=now + RETRY_DELAY / 2) is None
+    assert queue.claim("w", now=now + RETRY_DELAY)["attempts"] == 2
+    queue.fail(job_id, "boom again", now=now + RETRY_DELAY)
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["error"] == "boom again" and job["finished_at"] is not None
+    assert queue.claim("w", now=now + 100 * RETRY_DELAY) is None
+
+
+def test_complete_stores_the_result(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("mcqs", {"text": "x"})
+    queue.claim("w")
+    queue.complete(job_id, {"questions": [1, 2]})
+    job = queue.get(job_id)
+    assert job["status"] == "done" and job["progress"] == 1 and job["result"] == {"questions": [1, 2]}
+    assert queue.counts() == {"done": 1}
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("ocr", {})
+    now = time.time()
+    assert queue.claim("dead", now=now)["worker"] == "dead"
+    # Within the lease nobody else gets it
+    assert queue.claim("other", now=now + LEASE_SECONDS / 2) is None
+    job = queue.claim("other", now=now + LEASE_SECONDS + 1)
+    assert job["id"] == job_id and job["worker"] == "other" and job["attempts"] == 2
+
+
+def test_heartbeat_extends_the_lease(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("mcqs", {})
+    now = time.time()
+    queue.claim("w", now=now)
+    queue.heartbeat(job_id, now=now + LEASE_SECONDS)
+    assert queue.claim("other", now=now + LEASE_SECONDS + 1) is None
+    assert queue.get(job_id)["worker"] == "w"
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue("ocr", {}, max_attempts=1)
+    now = time.time()
+    queue.claim("dead", now=now)
+    assert queue.claim("other", now=now + LEASE_SECONDS + 1) is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "lease expired" in job["error"]
+    # A late result from the lost worker does not resurrect the job
+    queue.complete(job_id, {"late": True})
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_purge_removes_old_finished_jobs_and_their_spool_files(tmp_path):
+    queue = make_queue(tmp_path)
+    path = queue.spool(b"%PDF-1.4", ".pdf")
+    job_id = queue.enqueue("extract", {"path": path})
+    queue.claim("w")
+    queue.complete(job_id, {})
+    assert queue.purge(max_age=60) == 0
+    assert queue.purge(max_age=60, now=time.time() + 120) == 1
+    assert queue.get(job_id) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,20 @@
+# TextRank key-sentence selection on sparse similarity graphs.
+import warnings
+
+import numpy as np
+from scipy import sparse
+
+from key_sentences import select_key_sentences, textrank
+
+
+def test_textrank_ignores_self_similarity_without_sparse_warnings():
+    similarity = sparse.csr_matrix(np.array([[1, 0.5, 0], [0.5, 1, 0], [0, 0, 1]]))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", sparse.SparseEfficiencyWarning)
+        scores = textrank(similarity)
+    assert np.isclose(scores.sum(), 1) and scores[0] == scores[1] > scores[2]
+
+
+def test_select_key_sentences_keeps_the_top_sentence_when_over_budget():
+    text = "Atropine blocks muscarinic receptors in the heart. " * 3 + "Neostigmine inhibits cholinesterase."
+    assert select_key_sentences(text, budget=1)
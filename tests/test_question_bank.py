@@ -0,0 +1,77 @@
+# Question bank: MinHash/LSH near-duplicate detection and document/source links.
+import sqlite3
+
+import dedup
+from question_bank import QuestionBank
+
+ATROPINE = {
+    "stem": "Which drug is the prototype muscarinic receptor antagonist used to reverse bradycardia?",
+    "options": ["Atropine", "Neostigmine", "Pilocarpine", "Physostigmine"],
+    "answer": "a",
+    "difficulty": "easy",
+}
+NEOSTIGMINE = {
+    "stem": "Which reversible cholinesterase inhibitor is used to reverse nondepolarising neuromuscular block?",
+    "options": ["Edrophonium", "Neostigmine", "Atropine", "Succinylcholine"],
+    "answer": "b",
+    "difficulty": "medium",
+}
+
+
+def test_signatures_estimate_jaccard_similarity():
+    hasher = dedup.MinHasher()
+    first = hasher.signature(dedup.question_text(ATROPINE))
+    assert dedup.similarity(first, hasher.signature(dedup.question_text(ATROPINE))) == 1.0
+    assert dedup.similarity(first, hasher.signature(dedup.question_text(NEOSTIGMINE))) < dedup.THRESHOLD
+    assert (dedup.from_bytes(dedup.to_bytes(first)) == first).all()
+
+
+def test_near_duplicates_are_linked_not_stored(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.db"))
+    [first] = bank.add_questions([ATROPINE], "doc", "source-1")
+    # Same words with different case, punctuation and spacing, as overlapping chunks tend to produce
+    reworded = dict(ATROPINE, stem="which drug is THE prototype muscarinic-receptor antagonist,  used to reverse bradycardia")
+    duplicate, second = bank.add_questions([reworded, NEOSTIGMINE], "doc", "source-2")
+    assert duplicate == first and second != first
+    assert bank.count() == 2
+    # The second slice is served from the bank, the duplicate included
+    assert [q["id"] for q in bank.for_source("source-2")] == [first, second]
+    assert bank.find_duplicate(reworded) == first
+
+
+def test_documents_share_deduplicated_questions(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.db"))
+    bank.add_questions([ATROPINE, NEOSTIGMINE], "doc-a", "source-a", chapter="8", page=120)
+    bank.add_questions([ATROPINE, NEOSTIGMINE], "doc-b", "source-b", chapter="2", page=15)
+    assert bank.count() == 2
+    second = bank.for_document("doc-b")
+    assert len(second) == 2
+    # Chapter and page are where the question appears in the requested document
+    assert {(q["chapter"], q["page"]) for q in second} == {("2", 15)}
+    assert len(bank.for_document("doc-b", chapter="2")) == 2
+    assert bank.for_document("doc-b", chapter="8") == []
+
+
+def test_search_matches_stems(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.db"))
+    bank.add_questions([ATROPINE, NEOSTIGMINE], "doc", "source")
+    assert [q["stem"] for q in bank.search("cholinesterase")] == [NEOSTIGMINE["stem"]]
+    assert bank.search('"') == []
+
+
+def test_banks_from_before_dedup_are_signed_and_linked_on_open(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE questions (id INTEGER PRIMARY KEY, doc_hash TEXT NOT NULL, source_hash TEXT NOT NULL,"
+        " chapter TEXT, page INTEGER, stem TEXT NOT NULL, options TEXT NOT NULL, answer TEXT, created_at REAL NOT NULL);"
+        "INSERT INTO questions VALUES (1, 'doc', 'source', '8', 120,"
+        " 'Which drug is the prototype muscarinic receptor antagonist used to reverse bradycardia?',"
+        " '[\"Atropine\", \"Neostigmine\", \"Pilocarpine\", \"Physostigmine\"]', 'a', 0);"
+    )
+    conn.commit()
+    conn.close()
+    bank = QuestionBank(path)
+    assert [q["id"] for q in bank.for_document("doc")] == [1]
+    assert bank.add_questions([ATROPINE], "other-doc", "other-source") == [1]
+    assert bank.count() == 1
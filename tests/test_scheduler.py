@@ -0,0 +1,52 @@
+# SM-2 review scheduling: intervals, due queues and replicas sharing one database.
+import pytest
+
+from question_bank import QuestionBank
+from scheduler import DAY, MIN_EASE, START_EASE, ReviewScheduler, sm2
+
+
+def test_sm2_intervals_grow_with_ease():
+    interval, ease, reps, lapses = sm2(0, START_EASE, 0, 0, 5)
+    assert (interval, reps) == (1.0, 1) and ease > START_EASE
+    interval, ease, reps, lapses = sm2(interval, ease, reps, lapses, 4)
+    assert (interval, reps) == (6.0, 2)
+    interval, _, reps, _ = sm2(interval, ease, reps, lapses, 4)
+    assert interval == round(6.0 * ease) and reps == 3
+
+
+def test_sm2_lapse_resets_and_ease_has_a_floor():
+    assert sm2(30.0, 2.5, 5, 0, 1) == (1.0, 2.3, 0, 1)
+    assert sm2(1.0, MIN_EASE, 0, 3, 0)[1] == MIN_EASE
+
+
+def test_next_due_is_earliest_first_and_follows_reviews(tmp_path):
+    scheduler = ReviewScheduler(QuestionBank(str(tmp_path / "bank.db")))
+    assert scheduler.add_cards("ana", [3, 1, 2, 1], now=0) == 3
+    assert scheduler.add_cards("ana", [1, 4], now=10) == 1
+    assert scheduler.next_due("ana", now=10) == [1, 2, 3, 4]
+    assert scheduler.next_due("ana", n=2, now=10) == [1, 2]
+    due = scheduler.review("ana", 1, 5, now=20)
+    assert due == 20 + DAY
+    assert scheduler.next_due("ana", now=20) == [2, 3, 4]
+    assert scheduler.due_count("ana", now=20) == 3
+    assert scheduler.next_due("ana", now=due) == [2, 3, 4, 1]
+    # Students have separate decks
+    assert scheduler.next_due("ben", now=due) == []
+
+
+def test_review_of_unknown_card_raises(tmp_path):
+    scheduler = ReviewScheduler(QuestionBank(str(tmp_path / "bank.db")))
+    with pytest.raises(KeyError):
+        scheduler.review("ana", 99, 5)
+
+
+def test_replicas_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "bank.db")
+    first = ReviewScheduler(QuestionBank(path))
+    second = ReviewScheduler(QuestionBank(path))
+    first.add_cards("ana", [1, 2, 3], now=0)
+    assert second.next_due("ana", now=10) == [1, 2, 3]
+    second.review("ana", 1, 5, now=10)
+    second.add_cards("ana", [4], now=5)
+    assert first.next_due("ana", now=20) == [2, 3, 4]
+    assert first.next_due("ana", now=20) == first.next_due("ana", n=first.due_count("ana", now=20), now=20)
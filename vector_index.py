@@ -0,0 +1,139 @@
+# Dense vector index over text passages, searched with NumPy.
+#
+# Embeddings live in a float32 matrix on disk (vectors.f32, one row per passage)
+# that is opened with np.memmap, so an index larger than RAM can still be searched:
+# rows are scored block by block with a single matrix multiply per block and only
+# the running top-k survives between blocks.
+#
+# The embedding function is pluggable: any callable taking a list of strings and
+# returning an (n, dim) array works. EMBEDDER="package.module:callable" selects one
+# from the environment; the default is HashingEmbedder, which needs no model files
+# and gives the same vectors on every machine (handy for offline tests).
+import hashlib
+import importlib
+import json
+import os
+import re
+
+import numpy as np
+
+import metrics
+from pipeline import chunk_text, document_hash
+
+PASSAGE_CHARS = 1500
+BLOCK_ROWS = 65536
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join("data", "vectors"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# Deterministic feature-hashing embedder over unigrams and bigrams
+class HashingEmbedder:
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        tokens = _TOKEN.findall(text.lower())
+        return tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+# Function to pick the embedding function named by EMBEDDER, or the hashing embedder
+def get_embedder():
+    spec = os.getenv("EMBEDDER")
+    if not spec:
+        return HashingEmbedder()
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _embed(embedder, texts):
+    vectors = np.asarray(embedder(texts), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# Class holding a memory-mapped embedding matrix and the passages its rows belong to
+class VectorIndex:
+    def __init__(self, vectors, passages, embedder):
+        self.vectors = vectors
+        self.passages = passages
+        self.embedder = embedder
+
+    def __len__(self):
+        return len(self.passages)
+
+    # Embed passages batch by batch straight into a memory-mapped matrix under path
+    @classmethod
+    def build(cls, passages, path, embedder=None, batch_size=256):
+        embedder = embedder or get_embedder()
+        os.makedirs(path, exist_ok=True)
+        probe = _embed(embedder, passages[:1]) if passages else np.zeros((1, 1), np.float32)
+        dim = probe.shape[1]
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+",
+                            shape=(max(len(passages), 1), dim))
+        for start in range(0, len(passages), batch_size):
+            batch = passages[start:start + batch_size]
+            vectors[start:start + len(batch)] = _embed(embedder, batch)
+        vectors.flush()
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "count": len(passages), "embedder": getattr(embedder, "name", repr(embedder)),
+                       "passages": list(passages)}, f)
+        return cls.load(path, embedder)
+
+    # Open an index written by build() without reading the matrix into memory
+    @classmethod
+    def load(cls, path, embedder=None):
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                            shape=(max(meta["count"], 1), meta["dim"]))[:meta["count"]]
+        return cls(vectors, meta["passages"], embedder or get_embedder())
+
+    # Return the top-k (score, row) pairs for each query, scanning the matrix in blocks
+    def search_batch(self, queries, k=5):
+        q = _embed(self.embedder, list(queries))
+        best_scores = np.full((len(q), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(q), 0), dtype=np.int64)
+        for start in range(0, len(self.passages), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS])
+            scores = np.concatenate([best_scores, q @ block.T], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, start + len(block)), (len(q), len(block)))], axis=1)
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [list(zip(s.tolist(), r.tolist())) for s, r in zip(best_scores, best_rows)]
+
+    # Return the top-k (score, row) pairs for one query
+    def search(self, query, k=5):
+        return self.search_batch([query], k)[0]
+
+    # Return the top-k passages for a query, in document order
+    def retrieve(self, query, k=5):
+        return [self.passages[row] for row in sorted(row for _, row in self.search(query, k))]
+
+
+# Function to load the vector index for a document from disk, building it on first use
+def index_for_text(text, root=INDEX_DIR, embedder=None):
+    embedder = embedder or get_embedder()
+    name = getattr(embedder, "name", getattr(embedder, "__name__", "custom"))
+    path = os.path.join(root, document_hash(text), name)
+    if os.path.exists(os.path.join(path, "index.json")):
+        metrics.record_cache("vectors", True)
+        return VectorIndex.load(path, embedder)
+    metrics.record_cache("vectors", False)
+    return VectorIndex.build(chunk_text(text, PASSAGE_CHARS), path, embedder)
@@ -0,0 +1,158 @@
+# Worker processes for the durable job queue (see job_queue.py).
+#
+# Run alongside the Streamlit app and/or the API:
+#
+#   python worker.py --processes 4
+#   python worker.py --processes 1 --kinds mcqs
+#
+# Each process opens its own connection to the queue, claims one job at a time,
+# reports progress and stores the result. A background thread heartbeats the job
+# for as long as its handler runs, so a long LLM call or OCR pass that reports no
+# progress keeps its lease instead of being handed to a second worker. A job
+# that raises is retried with backoff; a worker that dies mid-job has its job
+# picked up by another worker once the lease runs out.
+#
+# Extraction, OCR and LLM calls happen here rather than in the app or the API, so
+# each worker process exports its own metrics: process i of a run serves them on
+# WORKER_METRICS_PORT + i (default 9110, ...; 0 or --metrics-port 0 disables).
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+
+from PIL import Image
+
+import figures
+import job_queue
+import key_sentences
+import metrics
+import question_bank
+import segment
+import spool
+import tables
+from pipeline import clean_text, document_hash, extract_pages, extract_text_from_image, join_pages, strip_headers
+
+POLL_INTERVAL = 1.0
+# Progress is written at most this often, so long jobs do not hammer the database
+PROGRESS_INTERVAL = 0.5
+# Finished jobs and their spooled files are kept this long so sessions can still reattach
+JOB_TTL = float(os.getenv("JOB_TTL", str(7 * 86400)))
+PURGE_INTERVAL = 3600.0
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9110"))
+
+
+# Function to extract and clean a spooled PDF page by page, with its outline for segmentation and its figure index
+def run_extract(payload, progress):
+    pages = extract_pages(
+        payload["path"], progress=lambda done, total: progress(done / total, f"page {done} of {total}"),
+        backend=payload.get("backend"), page_numbers=payload.get("pages"),
+    )
+    with spool.mapped(payload["path"]) as view:
+        outline = segment.read_outline(view)
+    text, page_starts = join_pages([clean_text(page) for page in strip_headers(pages)])
+    return {
+        "text": text, "page_starts": page_starts, "outline": outline, "pages": len(pages),
+        "doc_hash": tables.file_digest(payload["path"]),
+        "figures": figures.build_figure_index(text, page_starts),
+    }
+
+
+# Function to OCR a spooled image
+def run_ocr(payload, progress):
+    return {"text": extract_text_from_image(Image.open(payload["path"]))}
+
+
+# Function to generate (or serve from the bank) MCQs for a text slice, optionally cut to its key sentences
+def run_mcqs(payload, progress):
+    text = payload["text"]
+    doc_hash = payload.get("doc_hash") or document_hash(text)
+    if (payload.get("reduction") or 1) > 1:
+        text = key_sentences.select_key_sentences(text, factor=payload["reduction"])
+    questions, from_bank = question_bank.get_or_generate(
+        question_bank.default_bank(), text, doc_hash,
+        chapter=payload.get("chapter"), page=payload.get("page"), user=payload.get("user"),
+    )
+    return {"questions": questions, "from_bank": from_bank}
+
+
+HANDLERS = {"extract": run_extract, "ocr": run_ocr, "mcqs": run_mcqs}
+
+
+# Function to run one claimed job and record its outcome
+def run_job(queue, job):
+    last_write = [0.0]
+
+    def progress(fraction, message=None):
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            queue.progress(job["id"], fraction, message)
+
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(job_queue.HEARTBEAT_INTERVAL):
+            queue.heartbeat(job["id"])
+
+    beating = threading.Thread(target=heartbeat, name=f"heartbeat-{job['id']}", daemon=True)
+    beating.start()
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"unknown job kind {job['kind']!r}")
+        result = handler(job["payload"], progress)
+    except Exception as error:
+        traceback.print_exc()
+        queue.fail(job["id"], f"{type(error).__name__}: {error}")
+    else:
+        queue.complete(job["id"], result)
+    finally:
+        done.set()
+        beating.join()
+
+
+# Function to claim and run jobs until stopped, serving this process's metrics on metrics_port
+def work(kinds=None, metrics_port=0):
+    queue = job_queue.JobQueue()
+    job_queue.export_depth(queue)
+    if metrics_port and metrics.start_server(metrics_port) is None:
+        print(f"metrics port {metrics_port} is in use; this worker's metrics are not exported", flush=True)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    last_purge = 0.0
+    while True:
+        job = queue.claim(worker, kinds)
+        if job is not None:
+            run_job(queue, job)
+            continue
+        if time.time() - last_purge > PURGE_INTERVAL:
+            queue.purge(JOB_TTL)
+            last_purge = time.time()
+        time.sleep(POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run job queue workers")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--kinds", nargs="+", choices=sorted(HANDLERS), help="only run these job kinds")
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT,
+                        help="first metrics port; process i serves on port + i (0: no metrics)")
+    args = parser.parse_args()
+
+    processes = [
+        multiprocessing.Process(target=work, args=(args.kinds, args.metrics_port and args.metrics_port + i), daemon=True)
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()